@@ -1,7 +1,8 @@
 # Este código foi disponibilizado pelo proofessor da matéria para
 # termos um tipo array para usar na implementação do trabalho
 
-from typing import TypeVar, Iterator, Generic, overload, Tuple
+from __future__ import annotations
+from typing import TypeVar, Iterable, Iterator, Generic, overload, Tuple
 
 T = TypeVar('T')
 
@@ -27,6 +28,51 @@ class array(Generic[T]):
     ...
     IndexError: list index out of range
 
+    Exemplo com fatias e operações em bloco
+    >>> a = array([1, 2, 3, 4, 0, 0])
+    >>> a[1:3]
+    array([2, 3])
+    >>> a[4:6] = [5, 6]
+    >>> a
+    array([1, 2, 3, 4, 5, 6])
+    >>> a[0:2] = [7]
+    Traceback (most recent call last):
+    ...
+    ValueError: a fatia deve manter o tamanho do arranjo
+    >>> a.insert_at(1, 9, 4)
+    >>> a
+    array([1, 9, 2, 3, 4, 6])
+    >>> a.delete_at(0, 0)
+    1
+    >>> a
+    array([9, 2, 3, 4, 6, 0])
+    >>> b = array(8, -1)
+    >>> b.copy_from(a, 4)
+    >>> b
+    array([9, 2, 3, 4, -1, -1, -1, -1])
+    >>> b.fill(0, 2)
+    >>> b
+    array([9, 2, 0, 0, 0, 0, 0, 0])
+    >>> c = array([1, 2, 3])
+    >>> c.insert_at(0, 9, 3)
+    Traceback (most recent call last):
+    ...
+    IndexError: posição fora do arranjo
+    >>> c.insert_at(3, 9)
+    Traceback (most recent call last):
+    ...
+    IndexError: posição fora do arranjo
+    >>> c.copy_from(b, 5)
+    Traceback (most recent call last):
+    ...
+    ValueError: a fatia deve manter o tamanho do arranjo
+    >>> c.fill(0, 1, 6)
+    Traceback (most recent call last):
+    ...
+    ValueError: a fatia deve manter o tamanho do arranjo
+    >>> c
+    array([1, 2, 3])
+
     Exemplo com string
     >>> a = array(3, 'oi')
     >>> a
@@ -95,12 +141,94 @@ class array(Generic[T]):
     def __len__(self) -> int:
         return len(self.valores)
 
-    def __getitem__(self, i: int) -> T:
+    @overload
+    def __getitem__(self, i: int) -> T: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> array[T]: ...
+
+    def __getitem__(self, i: int | slice) -> T | array[T]:
+        if isinstance(i, slice):
+            return array(self.valores[i])
         return self.valores[i]
 
-    def __setitem__(self, i: int, value: T):
+    @overload
+    def __setitem__(self, i: int, value: T): ...
+
+    @overload
+    def __setitem__(self, i: slice, value: Iterable[T]): ...
+
+    def __setitem__(self, i, value):
+        if isinstance(i, slice):
+            values = value.valores if isinstance(value, array) else list(value)
+            # O tamanho do arranjo é fixo
+            if len(range(*i.indices(len(self.valores)))) != len(values):
+                raise ValueError('a fatia deve manter o tamanho do arranjo')
+            self.valores[i] = values
+        else:
+            self.valores[i] = value
+
+    def insert_at(self, i: int, value: T, end: int | None = None) -> None:
+        '''
+        Coloca *value* na posição *i*, deslocando os elementos das posições
+        *i* até *end* - 1 uma posição para a direita. O elemento que estava
+        na posição *end* é descartado.
+
+        Se *end* não for informado, o deslocamento vai até o fim do arranjo.
+
+        Requer 0 <= *i* <= *end* < len(self).
+        '''
+        if end is None:
+            end = len(self.valores) - 1
+        if not 0 <= i <= end < len(self.valores):
+            raise IndexError('posição fora do arranjo')
+        self.valores[i + 1:end + 1] = self.valores[i:end]
         self.valores[i] = value
 
+    def delete_at(self, i: int, value: T, end: int | None = None) -> T:
+        '''
+        Remove e devolve o elemento da posição *i*, deslocando os elementos
+        das posições *i* + 1 até *end* - 1 uma posição para a esquerda.
+        A posição *end* - 1, que fica livre, recebe *value*.
+
+        Se *end* não for informado, o deslocamento vai até o fim do arranjo.
+
+        Requer 0 <= *i* < *end* <= len(self).
+        '''
+        if end is None:
+            end = len(self.valores)
+        if not 0 <= i < end <= len(self.valores):
+            raise IndexError('posição fora do arranjo')
+        removed = self.valores[i]
+        self.valores[i:end - 1] = self.valores[i + 1:end]
+        self.valores[end - 1] = value
+        return removed
+
+    def copy_from(self, other: array[T], n: int) -> None:
+        '''
+        Copia os *n* primeiros elementos de *other* para as *n* primeiras
+        posições do arranjo.
+
+        Requer que os dois arranjos tenham pelo menos *n* elementos.
+        '''
+        if not 0 <= n <= min(len(self.valores), len(other.valores)):
+            raise ValueError('a fatia deve manter o tamanho do arranjo')
+        self.valores[:n] = other.valores[:n]
+
+    def fill(self, value: T, start: int = 0, end: int | None = None) -> None:
+        '''
+        Atribui *value* às posições de *start* até *end* - 1.
+
+        Se *end* não for informado, preenche até o fim do arranjo.
+
+        Requer 0 <= *start* <= *end* <= len(self).
+        '''
+        if end is None:
+            end = len(self.valores)
+        if not 0 <= start <= end <= len(self.valores):
+            raise ValueError('a fatia deve manter o tamanho do arranjo')
+        self.valores[start:end] = [value] * (end - start)
+
     def __iter__(self) -> Iterator[T]:
         return iter(self.valores)
 
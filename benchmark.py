@@ -0,0 +1,236 @@
+'''
+Medições de desempenho das implementações de coleção.
+
+Uso:
+    python benchmark.py [nome ...]
+
+Sem argumentos, executa todas as medições. Os nomes disponíveis estão
+em BENCHMARKS.
+'''
+from __future__ import annotations
+from collections import defaultdict
+import io
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+import collection_array
+import collection_encadeamento
+import importer
+
+
+def bench_array_insert(sizes: tuple[int, ...] = (10**3, 10**5, 10**6)) -> None:
+    '''
+    Vazão de insert em collection_array para *sizes* códigos distintos.
+
+    A coluna "novas" insere os códigos em ordem crescente, então cada
+    figurinha nova entra no fim do array e o custo medido é o da busca e
+    do crescimento. A coluna "repetidas" insere de novo todos os códigos
+    em ordem aleatória, o que mede apenas a busca da posição.
+    '''
+    print('collection_array.insert (inserções/s)')
+    print(f'{"distintas":>10} {"novas":>12} {"repetidas":>12}')
+    for n in sizes:
+        collection = collection_array.Collection(n - 1)
+        codes = list(range(n))
+        start = time.perf_counter()
+        for code in codes:
+            collection.insert(code)
+        new_time = time.perf_counter() - start
+
+        random.shuffle(codes)
+        start = time.perf_counter()
+        for code in codes:
+            collection.insert(code)
+        repeat_time = time.perf_counter() - start
+        print(f'{n:>10} {n / new_time:>12.0f} {n / repeat_time:>12.0f}')
+
+
+def bench_array_memory(sizes: tuple[int, ...] = (10**4, 10**5, 10**6)) -> None:
+    '''
+    Memória ocupada por figurinha distinta em collection_array, com os
+    grupos guardados como objetos StickersGroup e no modo compacto.
+
+    A medição usa tracemalloc e inclui a folga de capacidade do array e
+    os bitsets da coleção.
+    '''
+    print('collection_array memória (bytes por figurinha distinta)')
+    print(f'{"distintas":>10} {"objetos":>10} {"compacto":>10}')
+    for n in sizes:
+        per_entry = []
+        for compact in (False, True):
+            tracemalloc.start()
+            collection = collection_array.Collection(n - 1, compact=compact)
+            for code in range(n):
+                collection.insert(code)
+            used, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            per_entry.append(used / n)
+            del collection
+        print(f'{n:>10} {per_entry[0]:>10.1f} {per_entry[1]:>10.1f}')
+
+
+def bench_array_growth(n: int = 10**5,
+                       factors: tuple[float, ...] = (1.25, 1.5, 2.0, 4.0)) -> None:
+    '''
+    Carga de *n* figurinhas distintas em collection_array com diferentes
+    fatores de crescimento e com reserve(), usando os contadores de
+    realocação da coleção.
+    '''
+    print(f'collection_array crescimento ({n} figurinhas distintas)')
+    print(f'{"modo":>12} {"realocações":>12} {"copiadas":>10} {"capacidade":>11} {"segundos":>9}')
+    for factor in factors + (0.0,):
+        if factor:
+            label = f'fator {factor}'
+            collection = collection_array.Collection(n - 1, growth_factor=factor, shrink_threshold=0)
+        else:
+            label = 'reserve'
+            collection = collection_array.Collection(n - 1)
+        start = time.perf_counter()
+        if not factor:
+            collection.reserve(n)
+        for code in range(n):
+            collection.insert(code)
+        elapsed = time.perf_counter() - start
+        print(f'{label:>12} {collection.reallocations:>12} {collection.copied:>10} '
+              f'{collection.capacity:>11} {elapsed:>9.3f}')
+
+
+def bench_linked_churn(n: int = 10**4, ops: int = 10**5) -> None:
+    '''
+    Carga com muitas inserções e remoções em collection_encadeamento, com
+    e sem o reaproveitamento de nós. A coleção começa com *n* figurinhas
+    distintas e cada uma das *ops* rodadas insere uma figurinha nova e
+    remove uma existente.
+
+    Mostra quantos nós de figurinha foram criados, o pico de memória
+    medido com tracemalloc e o tempo. O ganho do reaproveitamento está na
+    quantidade de nós criados; o pico de memória é dominado pelos nós em
+    uso e fica praticamente igual nos dois casos.
+    '''
+    print(f'collection_encadeamento rotatividade ({n} distintas, {ops} rodadas)')
+    print(f'{"pool":>6} {"nós criados":>12} {"pico (KiB)":>11} {"segundos":>9}')
+    for pool_limit in (0, collection_encadeamento.POOL_LIMIT):
+        rnd = random.Random(1)
+        absent = list(range(n, 2 * n))
+        present = list(range(n))
+        tracemalloc.start()
+        collection = collection_encadeamento.Collection(2 * n, pool_limit=pool_limit)
+        for code in present:
+            collection.insert(code)
+        start = time.perf_counter()
+        for _ in range(ops):
+            i = rnd.randrange(n)
+            j = rnd.randrange(n)
+            collection.insert(absent[i])
+            collection.remove(present[j])
+            absent[i], present[j] = present[j], absent[i]
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f'{pool_limit:>6} {collection.allocated:>12} {peak / 1024:>11.0f} {elapsed:>9.3f}')
+
+
+def bench_linked_finger(n: int = 10**5, cluster: int = 64) -> None:
+    '''
+    Vazão de insert em collection_encadeamento para *n* códigos distintos
+    inseridos em ordem crescente, em grupos de *cluster* códigos
+    consecutivos embaralhados entre si e em ordem aleatória, com e sem a
+    busca a partir do último nó visitado (dedo).
+    '''
+    sorted_codes = list(range(n))
+    groups = [sorted_codes[i:i + cluster] for i in range(0, n, cluster)]
+    random.shuffle(groups)
+    clustered_codes = [code for group in groups for code in group]
+    random_codes = sorted_codes[:]
+    random.shuffle(random_codes)
+    orders = [('crescente', sorted_codes), ('agrupada', clustered_codes),
+              ('aleatória', random_codes)]
+
+    print(f'collection_encadeamento.insert com dedo ({n} distintas, inserções/s)')
+    print(f'{"ordem":>10} {"sem dedo":>10} {"com dedo":>10}')
+    for label, codes in orders:
+        rates = []
+        for finger_steps in (0, collection_encadeamento.FINGER_STEPS):
+            collection = collection_encadeamento.Collection(n, finger_steps=finger_steps)
+            start = time.perf_counter()
+            for code in codes:
+                collection.insert(code)
+            rates.append(n / (time.perf_counter() - start))
+        print(f'{label:>10} {rates[0]:>10.0f} {rates[1]:>10.0f}')
+
+
+def bench_snapshot(n: int = 10**5, max_unique: int = 2 * 10**5) -> None:
+    '''
+    Tamanho de uma coleção com *n* figurinhas sorteadas entre 0 e
+    *max_unique* no formato binário e no texto de str_stickers() e
+    str_repeat(), e o tempo para reconstruí-la a partir de cada um.
+    '''
+    codes = [random.randint(0, max_unique) for _ in range(n)]
+    print(f'snapshot ({n} figurinhas, códigos de 0 a {max_unique})')
+    print(f'{"coleção":>24} {"bytes":>9} {"texto":>9} {"from_bytes":>11} {"insert":>9}')
+    for module in (collection_array, collection_encadeamento):
+        collection = module.Collection(max_unique)
+        collection.insert_many(codes)
+        data = collection.to_bytes()
+        text = collection.str_stickers() + collection.str_repeat()
+
+        start = time.perf_counter()
+        module.Collection.from_bytes(data)
+        load_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        copy = module.Collection(max_unique)
+        for code, extra in collection.iter_stickers():
+            for _ in range(extra + 1):
+                copy.insert(code)
+        insert_time = time.perf_counter() - start
+        print(f'{module.__name__:>24} {len(data):>9} {len(text):>9} '
+              f'{load_time:>11.3f} {insert_time:>9.3f}')
+
+
+def bench_import(rows: int = 5 * 10**5, collectors: int = 1000,
+                 max_unique: int = 700) -> None:
+    '''
+    Vazão de importer.import_inventories() para um arquivo de *rows* linhas
+    de *collectors* colecionadores, comparada com um insert() por unidade
+    das mesmas linhas já lidas.
+    '''
+    lines = []
+    for _ in range(rows):
+        count = random.choice((1, 1, 1, 2, 3))
+        lines.append(f'{random.randrange(collectors)},{random.randint(0, max_unique)},{count}\n')
+    text = ''.join(lines)
+    print(f'importer ({rows} linhas, {collectors} colecionadores)')
+    print(f'{"caminho":>10} {"linhas/s":>12}')
+
+    found: defaultdict[int, collection_array.Collection] = defaultdict(
+        lambda: collection_array.Collection(max_unique))
+    stats = importer.import_inventories(io.StringIO(text), found)
+    print(f'{"importer":>10} {stats.rows_per_second:>12.0f}')
+
+    parsed = [tuple(map(int, line.split(','))) for line in lines]
+    found = defaultdict(lambda: collection_array.Collection(max_unique))
+    start = time.perf_counter()
+    for collector, code, count in parsed:
+        collection = found[collector]
+        for _ in range(count):
+            collection.insert(code)
+    print(f'{"insert":>10} {rows / (time.perf_counter() - start):>12.0f}')
+
+
+BENCHMARKS: dict[str, Callable[[], None]] = {
+    'array_insert': bench_array_insert,
+    'array_memory': bench_array_memory,
+    'array_growth': bench_array_growth,
+    'linked_churn': bench_linked_churn,
+    'linked_finger': bench_linked_finger,
+    'snapshot': bench_snapshot,
+    'import': bench_import,
+}
+
+if __name__ == '__main__':
+    for name in sys.argv[1:] or list(BENCHMARKS):
+        BENCHMARKS[name]()
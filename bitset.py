@@ -0,0 +1,234 @@
+from __future__ import annotations
+from array import array
+from typing import Callable, Iterator
+
+# Quantidade de bits em cada palavra do conjunto
+WORD_BITS = 64
+# Palavra com todos os bits ligados
+FULL_WORD = (1 << WORD_BITS) - 1
+
+
+class Bitset:
+    '''
+    Um conjunto de inteiros de 0 a *size* - 1 representado por um bit
+    para cada valor. Os bits são agrupados em palavras de 64 bits, o que
+    permite combinar conjuntos inteiros com poucas operações.
+
+    Exemplos:
+    >>> s = Bitset(130)
+    >>> s.add(3)
+    >>> s.add(64)
+    >>> s.add(129)
+    >>> 64 in s
+    True
+    >>> 65 in s
+    False
+    >>> s.discard(64)
+    >>> s.discard(64) # não está no conjunto, então nada deve ocorrer
+    >>> list(s)
+    [3, 129]
+    >>> len(s)
+    2
+    >>> s.next_set(4), s.next_clear(3), s.prev_set(128), s.next_set(130)
+    (129, 4, 3, None)
+    >>> list(s.iter_clear(0, 6))
+    [0, 1, 2, 4, 5]
+    '''
+    # Quantidade de valores possíveis
+    size: int
+    # Palavras de 64 bits; o bit i da palavra w representa o valor 64 * w + i
+    words: array
+
+    def __init__(self, size: int) -> None:
+        '''
+        Cria um conjunto vazio para os valores de 0 a *size* - 1.
+        '''
+        self.size = size
+        self.words = array('Q', [0]) * ((size + WORD_BITS - 1) // WORD_BITS)
+
+    def add(self, i: int) -> None:
+        '''
+        Adiciona *i* ao conjunto.
+        '''
+        self.words[i // WORD_BITS] |= 1 << (i % WORD_BITS)
+
+    def discard(self, i: int) -> None:
+        '''
+        Remove *i* do conjunto. Se *i* não estiver no conjunto, nada acontece.
+        '''
+        self.words[i // WORD_BITS] &= ~(1 << (i % WORD_BITS))
+
+    def __contains__(self, i: int) -> bool:
+        return (self.words[i // WORD_BITS] >> (i % WORD_BITS)) & 1 == 1
+
+    def __len__(self) -> int:
+        return sum(word.bit_count() for word in self.words)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(lowest_bits(self.words, len(self.words) * WORD_BITS))
+
+    def next_set(self, i: int) -> int | None:
+        '''
+        Menor valor do conjunto maior ou igual a *i*, ou None se não houver.
+        Palavras sem nenhum bit ligado são puladas de uma vez.
+        '''
+        i = max(i, 0)
+        w = i // WORD_BITS
+        if w >= len(self.words):
+            return None
+        word = self.words[w] & (FULL_WORD << (i % WORD_BITS))
+        while word == 0:
+            w += 1
+            if w == len(self.words):
+                return None
+            word = self.words[w]
+        return w * WORD_BITS + (word & -word).bit_length() - 1
+
+    def next_clear(self, i: int) -> int | None:
+        '''
+        Menor valor de *i* a *size* - 1 que não está no conjunto, ou None se
+        não houver. Palavras com todos os bits ligados são puladas de uma vez.
+        '''
+        i = max(i, 0)
+        if i >= self.size:
+            return None
+        w = i // WORD_BITS
+        word = ~self.words[w] & FULL_WORD & (FULL_WORD << (i % WORD_BITS))
+        while word == 0:
+            w += 1
+            if w == len(self.words):
+                return None
+            word = ~self.words[w] & FULL_WORD
+        value = w * WORD_BITS + (word & -word).bit_length() - 1
+        # Os bits depois de *size* na última palavra ficam sempre desligados
+        return value if value < self.size else None
+
+    def prev_set(self, i: int) -> int | None:
+        '''
+        Maior valor do conjunto menor ou igual a *i*, ou None se não houver.
+        Palavras sem nenhum bit ligado são puladas de uma vez.
+        '''
+        i = min(i, self.size - 1)
+        if i < 0:
+            return None
+        w = i // WORD_BITS
+        word = self.words[w] & (FULL_WORD >> (WORD_BITS - 1 - i % WORD_BITS))
+        while word == 0:
+            w -= 1
+            if w < 0:
+                return None
+            word = self.words[w]
+        return w * WORD_BITS + word.bit_length() - 1
+
+    def iter_clear(self, lo: int, hi: int) -> Iterator[int]:
+        '''
+        Percorre, em ordem crescente, os valores de *lo* a *hi* - 1 que não
+        estão no conjunto. Palavras com todos os bits ligados são puladas de
+        uma vez, então o custo é proporcional aos valores gerados mais as
+        palavras puladas.
+        '''
+        lo = max(lo, 0)
+        hi = min(hi, self.size)
+        if lo >= hi:
+            return
+        w = lo // WORD_BITS
+        word = ~self.words[w] & FULL_WORD & (FULL_WORD << (lo % WORD_BITS))
+        while True:
+            while word != 0:
+                low = word & -word
+                value = w * WORD_BITS + low.bit_length() - 1
+                if value >= hi:
+                    return
+                yield value
+                word ^= low
+            w += 1
+            if w * WORD_BITS >= hi:
+                return
+            word = ~self.words[w] & FULL_WORD
+
+
+def lowest_bits(words: list[int] | array | memoryview, k: int) -> list[int]:
+    '''
+    Devolve, em ordem crescente, os *k* menores valores cujos bits estão
+    ligados em *words*. Se houver menos de *k* bits ligados, devolve todos.
+    '''
+    values: list[int] = []
+    w = 0
+    while w < len(words) and len(values) < k:
+        word = words[w]
+        # Palavras cheias de bits desligados são puladas de uma vez
+        while word != 0 and len(values) < k:
+            low = word & -word
+            values.append(w * WORD_BITS + low.bit_length() - 1)
+            word ^= low
+        w += 1
+    return values
+
+
+def eligible(dup: Bitset, owned: Bitset,
+             index: list[int] | None = None) -> tuple[int, Callable[[int], list[int]]]:
+    '''
+    Procura as figurinhas de *dup* que não estão em *owned*. Devolve a
+    quantidade delas e uma função que recebe *k* e devolve, em ordem
+    crescente, as *k* menores.
+
+    *index*, se dado, é a lista em ordem crescente dos valores de *dup*.
+    Quando ela tem menos valores do que *dup* tem palavras, a busca percorre
+    a lista em vez das palavras.
+
+    Exemplos:
+    >>> dup, owned = Bitset(200), Bitset(200)
+    >>> for code in [5, 70, 199]:
+    ...     dup.add(code)
+    >>> owned.add(70)
+    >>> count, lowest = eligible(dup, owned)
+    >>> count, lowest(1)
+    (2, [5])
+    >>> count, lowest = eligible(dup, owned, [5, 70, 199])
+    >>> count, lowest(2)
+    (2, [5, 199])
+    '''
+    if index is not None and len(index) < len(dup.words):
+        codes = [code for code in index if code not in owned]
+        return len(codes), lambda k: codes[:k]
+    words = [d & ~o for d, o in zip(dup.words, owned.words)]
+    return sum(word.bit_count() for word in words), lambda k: lowest_bits(words, k)
+
+
+def exchange_codes(self_owned: Bitset, self_dup: Bitset,
+                   other_owned: Bitset, other_dup: Bitset,
+                   self_index: list[int] | None = None,
+                   other_index: list[int] | None = None) -> tuple[list[int], list[int]]:
+    '''
+    Calcula as trocas entre duas coleções a partir dos conjuntos das
+    figurinhas que cada uma possui (*owned*) e das que cada uma tem
+    repetidas (*dup*).
+
+    Devolve o par (enviadas, recebidas): os códigos que a primeira coleção
+    envia para a segunda e os que ela recebe. As duas listas têm o mesmo
+    tamanho e contêm os menores códigos elegíveis de cada lado.
+
+    *self_index* e *other_index* são, opcionalmente, as listas em ordem
+    crescente das repetidas de cada coleção (veja eligible()).
+
+    Exemplos:
+    >>> a_owned, a_dup = Bitset(61), Bitset(61)
+    >>> b_owned, b_dup = Bitset(61), Bitset(61)
+    >>> for code in [3, 12, 29, 33, 41, 54, 60]:
+    ...     a_owned.add(code)
+    >>> for code in [3, 54, 60]:
+    ...     a_dup.add(code)
+    >>> for code in [0, 9, 12, 51]:
+    ...     b_owned.add(code)
+    >>> for code in [0, 12, 51]:
+    ...     b_dup.add(code)
+    >>> exchange_codes(a_owned, a_dup, b_owned, b_dup)
+    ([3, 54], [0, 51])
+    >>> exchange_codes(a_owned, a_dup, b_owned, b_dup, [3, 54, 60], [0, 12, 51])
+    ([3, 54], [0, 51])
+    '''
+    # Elegíveis: repetidas em um lado que o outro lado não possui
+    give_count, give = eligible(self_dup, other_owned, self_index)
+    take_count, take = eligible(other_dup, self_owned, other_index)
+    trades = min(give_count, take_count)
+    return give(trades), take(trades)
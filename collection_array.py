@@ -1,8 +1,21 @@
 from __future__ import annotations
+from array import array as typed_array
 from array_ed import array
+from bisect import bisect_left
+from bitset import Bitset, exchange_codes
 from dataclasses import dataclass
+from fenwick import CodeRanks
+from snapshot import decode_delta
+from tad_collection import Collection as TadCollection, RenderCache, count_codes, merge_counts
+from typing import Iterable, Iterator
+import math
+import sys
 
 INITIAL_ARRAY_SIZE = 2
+# Fator pelo qual a capacidade é multiplicada quando o array enche
+GROWTH_FACTOR = 2.0
+# Ocupação abaixo da qual o array é reduzido automaticamente
+SHRINK_THRESHOLD = 0.25
 
 @dataclass
 class StickersGroup():
@@ -19,7 +32,269 @@ class StickersGroup():
     code: int
     quant: int
 
-class Collection:
+class GroupStorage:
+    '''
+    Armazenamento das figurinhas de uma coleção como objetos StickersGroup
+    em um array de tamanho fixo.
+
+    As posições livres guardam um grupo sentinela de código None.
+
+    Exemplos:
+    >>> s = GroupStorage(4)
+    >>> s.insert_at(0, 7, 1, 0)
+    >>> s.insert_at(0, 2, 3, 1)
+    >>> [s.code(i) for i in range(len(s))]
+    [2, 7, None, None]
+    >>> s.add_quant(0, 1)
+    4
+    >>> s.search(7, 2)
+    1
+    >>> s.shift(0, 2, 1)
+    >>> s.set(0, 1, 1)
+    >>> [s.code(i) for i in range(len(s))]
+    [1, 2, 7, None]
+    >>> s.delete_at(0, 3)
+    >>> s.delete_at(0, 2)
+    >>> [s.code(i) for i in range(len(s))]
+    [7, None, None, None]
+    '''
+    # Grupos de figurinhas
+    groups: array[StickersGroup]
+
+    def __init__(self, capacity: int) -> None:
+        '''
+        Cria um armazenamento vazio com *capacity* posições.
+        '''
+        self.groups = array(capacity, StickersGroup(None, 0)) #type: ignore
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def code(self, i: int) -> int | None:
+        '''
+        Retorna o código da figurinha da posição *i* ou None se ela estiver livre.
+        '''
+        return self.groups[i].code
+
+    def quant(self, i: int) -> int:
+        '''
+        Retorna a quantidade da figurinha da posição *i*.
+        '''
+        return self.groups[i].quant
+
+    def add_quant(self, i: int, delta: int) -> int:
+        '''
+        Soma *delta* à quantidade da figurinha da posição *i* e retorna
+        a nova quantidade.
+        '''
+        self.groups[i].quant += delta
+        return self.groups[i].quant
+
+    def set(self, i: int, code: int, quant: int) -> None:
+        '''
+        Guarda a figurinha *code* com quantidade *quant* na posição *i*.
+        '''
+        self.groups[i] = StickersGroup(code, quant)
+
+    def shift(self, start: int, end: int, offset: int) -> None:
+        '''
+        Move as figurinhas das posições *start* até *end* - 1 em *offset*
+        posições para a direita (ou para a esquerda, se *offset* for negativo).
+        '''
+        self.groups[start + offset:end + offset] = self.groups[start:end]
+
+    def clear(self, start: int, end: int) -> None:
+        '''
+        Libera as posições *start* até *end* - 1.
+        '''
+        self.groups.fill(StickersGroup(None, 0), start, end) #type: ignore
+
+    def insert_at(self, i: int, code: int, quant: int, end: int) -> None:
+        '''
+        Insere a figurinha *code* com quantidade *quant* na posição *i*,
+        deslocando as posições *i* até *end* - 1 para a direita.
+        '''
+        self.groups.insert_at(i, StickersGroup(code, quant), end)
+
+    def delete_at(self, i: int, end: int) -> None:
+        '''
+        Remove a figurinha da posição *i*, deslocando as posições *i* + 1
+        até *end* - 1 para a esquerda. A posição *end* - 1 fica livre.
+        '''
+        self.groups.delete_at(i, StickersGroup(None, 0), end) #type: ignore
+
+    def search(self, code: int, n: int) -> int:
+        '''
+        Busca binária de *code* entre as *n* primeiras posições. Retorna
+        a posição de *code* ou a posição onde ele deveria ser inserido.
+        '''
+        return bisect_left(self.groups, code, 0, n, key=lambda group: group.code)
+
+    def items(self, start: int, end: int) -> Iterator[tuple[int, int]]:
+        '''
+        Gera os pares (código, quantidade) das posições *start* até *end* - 1.
+        '''
+        for i in range(start, end):
+            group = self.groups[i]
+            yield group.code, group.quant
+
+    def resize(self, capacity: int, n: int) -> None:
+        '''
+        Altera o número de posições para *capacity*, mantendo as *n*
+        primeiras figurinhas.
+        '''
+        new = array(capacity, StickersGroup(None, 0)) #type: ignore
+        new.copy_from(self.groups, n)
+        self.groups = new
+
+    def nbytes(self, n: int) -> int:
+        '''
+        Estimativa dos bytes ocupados pelo armazenamento com *n* figurinhas.
+        '''
+        size = sys.getsizeof(self.groups.valores)
+        for i in range(n):
+            group = self.groups[i]
+            size += sys.getsizeof(group) + sys.getsizeof(group.__dict__)
+        return size
+
+class CompactStorage:
+    '''
+    Armazenamento das figurinhas de uma coleção em dois arrays tipados
+    paralelos, um com os códigos e outro com as quantidades. Ocupa poucos
+    bytes por figurinha e mantém os dados contíguos na memória.
+
+    As posições livres guardam o código sentinela NO_CODE, que é devolvido
+    como None, assim como no GroupStorage.
+
+    Exemplos:
+    >>> s = CompactStorage(4)
+    >>> s.insert_at(0, 7, 1, 0)
+    >>> s.insert_at(0, 2, 3, 1)
+    >>> [s.code(i) for i in range(len(s))]
+    [2, 7, None, None]
+    >>> s.add_quant(0, 1)
+    4
+    >>> s.search(7, 2)
+    1
+    >>> s.shift(0, 2, 1)
+    >>> s.set(0, 1, 1)
+    >>> [s.code(i) for i in range(len(s))]
+    [1, 2, 7, None]
+    >>> s.delete_at(0, 3)
+    >>> s.delete_at(0, 2)
+    >>> [s.code(i) for i in range(len(s))]
+    [7, None, None, None]
+    '''
+    # Códigos das figurinhas
+    codes: typed_array
+    # Quantidades das figurinhas, na mesma posição do código
+    quants: typed_array
+
+    # Código das posições livres
+    NO_CODE = -1
+
+    def __init__(self, capacity: int) -> None:
+        '''
+        Cria um armazenamento vazio com *capacity* posições.
+        '''
+        self.codes = typed_array('i', [self.NO_CODE]) * capacity
+        self.quants = typed_array('i', [0]) * capacity
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def code(self, i: int) -> int | None:
+        '''
+        Retorna o código da figurinha da posição *i* ou None se ela estiver livre.
+        '''
+        code = self.codes[i]
+        if code == self.NO_CODE:
+            return None
+        return code
+
+    def quant(self, i: int) -> int:
+        '''
+        Retorna a quantidade da figurinha da posição *i*.
+        '''
+        return self.quants[i]
+
+    def add_quant(self, i: int, delta: int) -> int:
+        '''
+        Soma *delta* à quantidade da figurinha da posição *i* e retorna
+        a nova quantidade.
+        '''
+        self.quants[i] += delta
+        return self.quants[i]
+
+    def set(self, i: int, code: int, quant: int) -> None:
+        '''
+        Guarda a figurinha *code* com quantidade *quant* na posição *i*.
+        '''
+        self.codes[i] = code
+        self.quants[i] = quant
+
+    def shift(self, start: int, end: int, offset: int) -> None:
+        '''
+        Move as figurinhas das posições *start* até *end* - 1 em *offset*
+        posições para a direita (ou para a esquerda, se *offset* for negativo).
+        '''
+        self.codes[start + offset:end + offset] = self.codes[start:end]
+        self.quants[start + offset:end + offset] = self.quants[start:end]
+
+    def clear(self, start: int, end: int) -> None:
+        '''
+        Libera as posições *start* até *end* - 1.
+        '''
+        self.codes[start:end] = typed_array('i', [self.NO_CODE]) * (end - start)
+        self.quants[start:end] = typed_array('i', [0]) * (end - start)
+
+    def insert_at(self, i: int, code: int, quant: int, end: int) -> None:
+        '''
+        Insere a figurinha *code* com quantidade *quant* na posição *i*,
+        deslocando as posições *i* até *end* - 1 para a direita.
+        '''
+        self.codes[i + 1:end + 1] = self.codes[i:end]
+        self.quants[i + 1:end + 1] = self.quants[i:end]
+        self.set(i, code, quant)
+
+    def delete_at(self, i: int, end: int) -> None:
+        '''
+        Remove a figurinha da posição *i*, deslocando as posições *i* + 1
+        até *end* - 1 para a esquerda. A posição *end* - 1 fica livre.
+        '''
+        self.codes[i:end - 1] = self.codes[i + 1:end]
+        self.quants[i:end - 1] = self.quants[i + 1:end]
+        self.set(end - 1, self.NO_CODE, 0)
+
+    def search(self, code: int, n: int) -> int:
+        '''
+        Busca binária de *code* entre as *n* primeiras posições. Retorna
+        a posição de *code* ou a posição onde ele deveria ser inserido.
+        '''
+        return bisect_left(self.codes, code, 0, n)
+
+    def items(self, start: int, end: int) -> Iterator[tuple[int, int]]:
+        '''
+        Gera os pares (código, quantidade) das posições *start* até *end* - 1.
+        '''
+        return zip(self.codes[start:end], self.quants[start:end])
+
+    def resize(self, capacity: int, n: int) -> None:
+        '''
+        Altera o número de posições para *capacity*, mantendo as *n*
+        primeiras figurinhas.
+        '''
+        free = capacity - n
+        self.codes = self.codes[:n] + typed_array('i', [self.NO_CODE]) * free
+        self.quants = self.quants[:n] + typed_array('i', [0]) * free
+
+    def nbytes(self, n: int) -> int:
+        '''
+        Estimativa dos bytes ocupados pelo armazenamento com *n* figurinhas.
+        '''
+        return sys.getsizeof(self.codes) + sys.getsizeof(self.quants)
+
+class Collection(TadCollection):
     '''
     Uma coleção de figurinhas de um determinado álbum.
     Indica quais e quantas figurinhas o colecionador possui, além
@@ -133,24 +408,170 @@ class Collection:
     '[0, 3, 9, 12, 51, 54]'
     >>> b.str_repeat()
     '[12 (1), 51 (1)]'
+    >>> # Armazenamento compacto, em arrays paralelos
+    >>> c = Collection(60, compact=True)
+    >>> for code in [2, 1, 7, 1]:
+    ...     c.insert(code)
+    >>> c.remove(7)
+    >>> c.exchange(b)
+    >>> c.str_stickers()
+    '[1, 2, 12]'
+    >>> c.str_repeat()
+    '[]'
+    >>> b.str_stickers()
+    '[0, 1, 3, 9, 12, 51, 54]'
+    >>> b.str_repeat()
+    '[51 (1)]'
+    >>> # Gerenciamento de capacidade
+    >>> d = Collection(1000, growth_factor=1.5)
+    >>> d.reserve(100)
+    >>> d.capacity
+    100
+    >>> for code in range(100):
+    ...     d.insert(code)
+    >>> d.reallocations
+    1
+    >>> for code in range(90):
+    ...     d.remove(code)
+    >>> d.capacity # a capacidade reservada não é reduzida automaticamente
+    100
+    >>> d.shrink_to_fit()
+    >>> d.capacity
+    10
+    >>> d.reallocations, d.copied
+    (2, 10)
+    >>> e = Collection(1000)
+    >>> for code in range(100):
+    ...     e.insert(code)
+    >>> e.capacity
+    127
+    >>> for code in range(80):
+    ...     e.remove(code)
+    >>> e.capacity
+    62
+    >>> # Inserções e remoções em lote
+    >>> f = Collection(60)
+    >>> f.insert_many([5, 3, 61, 5, 8, 3, 5, -2])
+    >>> f.str_stickers()
+    '[3, 5, 8]'
+    >>> f.str_repeat()
+    '[3 (1), 5 (2)]'
+    >>> f.insert_many([1, 8, 9])
+    >>> f.remove_many([3, 3, 3, 8, 1, 40])
+    >>> f.str_stickers()
+    '[5, 8, 9]'
+    >>> f.str_repeat()
+    '[5 (2)]'
+    >>> # Percurso e escrita sem montar a string
+    >>> list(f.iter_stickers())
+    [(5, 2), (8, 0), (9, 0)]
+    >>> list(f.iter_repeats())
+    [(5, 2)]
+    >>> import sys
+    >>> f.write_repeat(sys.stdout)
+    [5 (2)]
+    >>> # Textos guardados até a próxima alteração
+    >>> f.cache.hits, f.cache.misses
+    (0, 4)
+    >>> f.str_stickers()
+    '[5, 8, 9]'
+    >>> f.cache.hits, f.cache.misses
+    (1, 4)
+    >>> f.insert(7)
+    >>> f.str_stickers()
+    '[5, 7, 8, 9]'
+    >>> f.cache.hits, f.cache.misses
+    (1, 5)
+    >>> # Cópia pelo formato binário
+    >>> g = Collection.from_bytes(f.to_bytes(), compact=True)
+    >>> g.str_stickers(), g.str_repeat()
+    ('[5, 7, 8, 9]', '[5 (2)]')
+    >>> # Sincronização por diferenças
+    >>> h = Collection(60)
+    >>> h.insert_many([5, 9, 9, 30])
+    >>> delta = h.diff(g)
+    >>> len(delta)
+    17
+    >>> h.apply_delta(delta)
+    >>> h.str_stickers(), h.str_repeat()
+    ('[5, 7, 8, 9]', '[5 (2)]')
     ''' 
     # Total de figurinhas únicas
     tot_stickers: int
+    # Total de unidades de figurinhas, contando as repetidas
+    tot_units: int
+    # Códigos das figurinhas repetidas, em ordem crescente
+    duplicate_index: list[int]
+    # Contagens por intervalo de códigos, criadas na primeira consulta
+    ranks: CodeRanks | None
     # Máximo de figurinhas únicas
     max_unique: int
     # Agrupamento das figurinhas
-    stickers: array[StickersGroup]
+    stickers: GroupStorage | CompactStorage
+    # Figurinhas que a coleção possui
+    owned: Bitset
+    # Figurinhas que a coleção possui repetidas
+    duplicated: Bitset
+    # Número da versão da coleção, que muda a cada alteração
+    version: int
+    # Textos de str_stickers() e str_repeat() guardados entre as alterações
+    cache: RenderCache
+    # Fator de crescimento do array quando ele enche
+    growth_factor: float
+    # Ocupação abaixo da qual o array é reduzido automaticamente
+    shrink_threshold: float
+    # Capacidade mínima pedida com reserve()
+    reserved: int
+    # Quantidade de realocações do array
+    reallocations: int
+    # Quantidade de figurinhas copiadas nas realocações
+    copied: int
 
     # MÉTODOS PRINCIPAIS
 
-    def __init__(self, max_unique: int) -> None:
+    def __init__(self, max_unique: int, compact: bool = False,
+                 growth_factor: float = GROWTH_FACTOR,
+                 shrink_threshold: float = SHRINK_THRESHOLD,
+                 cache_limit: int | None = None) -> None:
         '''
         Cria uma coleção em relação a um álbum com *max_unique* figurinhas únicas,
         ou seja, os códigos das figurinhas variam de 0 a *max_unique*.
-        '''
+
+        Se *compact* for True, as figurinhas são guardadas em arrays tipados
+        paralelos (CompactStorage) em vez de objetos StickersGroup.
+
+        Quando o array enche, sua capacidade é multiplicada por
+        *growth_factor*. Quando a ocupação fica abaixo de *shrink_threshold*,
+        a capacidade é reduzida para deixar a ocupação em 1 / *growth_factor*.
+        Para evitar realocações em sequência, *shrink_threshold* deve ser
+        menor que 1 / *growth_factor*; 0 desativa a redução automática.
+
+        Os textos de str_stickers() e str_repeat() são guardados até a
+        próxima alteração da coleção, exceto os com mais de *cache_limit*
+        caracteres; None não impõe limite.
+        '''
+        if growth_factor <= 1:
+            raise ValueError('O fator de crescimento deve ser maior que 1')
+        if not 0 <= shrink_threshold < 1 / growth_factor:
+            raise ValueError('O limite de redução deve estar entre 0 e 1 / growth_factor')
         self.max_unique = max_unique
         self.tot_stickers = 0
-        self.stickers = array(INITIAL_ARRAY_SIZE, StickersGroup(None, 0)) #type: ignore
+        self.tot_units = 0
+        self.duplicate_index = []
+        self.ranks = None
+        self.growth_factor = growth_factor
+        self.shrink_threshold = shrink_threshold
+        self.reserved = 0
+        self.reallocations = 0
+        self.copied = 0
+        if compact:
+            self.stickers = CompactStorage(INITIAL_ARRAY_SIZE)
+        else:
+            self.stickers = GroupStorage(INITIAL_ARRAY_SIZE)
+        self.owned = Bitset(max_unique + 1)
+        self.duplicated = Bitset(max_unique + 1)
+        self.version = 0
+        self.cache = RenderCache(cache_limit)
     
     def insert(self, code: int) -> None:
         '''
@@ -160,14 +581,16 @@ class Collection:
         Se a figurinha não estiver no intervalo das possíveis figurinhas
         do álbum, nada acontece.
         '''
-        pos = self.__position(code)
+        pos, found = self.__search(code)
         # Está na lista na posição *pos* -> atualiza quantidade
-        if pos is not None:
-            self.stickers[pos].quant += 1
-        # Não está na lista, mas é válido -> insere ordenado
+        if found:
+            quant = self.stickers.add_quant(pos, 1)
+            self.__track(code, quant - 1, quant)
+        # Não está na lista, mas é válido -> insere na posição *pos*
         elif code >= 0 and code <= self.max_unique:
-            self.__ordered_insert(code)
+            self.__ordered_insert(pos, code)
             self.tot_stickers += 1
+            self.__track(code, 0, 1)
 
     def remove(self, code: int) -> None:
         '''
@@ -178,51 +601,73 @@ class Collection:
         '''
         i = self.__position(code)
         if i is not None:
-            self.stickers[i].quant -= 1
+            quant = self.stickers.add_quant(i, -1)
+            self.__track(code, quant + 1, quant)
             # Se não houver mais figurinhas do tipo, removemos do array
-            if self.stickers[i].quant == 0:
-                while i < self.tot_stickers:
-                    self.stickers[i] = self.stickers[i+1]
-                    i += 1
+            if quant == 0:
+                self.stickers.delete_at(i, self.tot_stickers)
                 self.tot_stickers -= 1
+                self.__shrink_if_sparse()
+
+    def insert_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar insert() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os junta à coleção em uma só passada.
+        '''
+        self.__apply(count_codes(codes, self.max_unique))
+
+    def insert_counts(self, pairs: Iterable[tuple[int, int]]) -> None:
+        '''
+        Equivale a chamar insert() *count* vezes para cada par (code, count)
+        de *pairs*, sem expandir as quantidades. Se a coleção estiver vazia,
+        as figurinhas são escritas direto nas posições finais.
+        '''
+        batch = merge_counts(pairs, self.max_unique)
+        if self.__is_empty():
+            self.__load([code for code, _ in batch], [count for _, count in batch])
+        else:
+            self.__apply(batch)
+
+    def remove_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar remove() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os retira da coleção em uma só passada.
+        '''
+        self.__apply([(code, -count) for code, count in count_codes(codes, self.max_unique)])
     
-    def str_stickers(self) -> str:
-        '''
-        Gera uma representação em formato de sting das figurinhas da coleção.
-        '''
-        string = '['
-        # adiciona o primeiro elemento (se houver)
-        if not self.__is_empty():
-            string += str(self.stickers[0].code)
-        # adiciona demais elementos
-        i = 1
-        while i < self.tot_stickers:
-            string += f', {str(self.stickers[i].code)}'
-            i += 1
-        return string + ']'
-    
-    def str_repeat(self) -> str:
-        '''
-        Gera uma representação em formato de string das figurinhas repetidas
-        da coleção, junto com a quantidade (além da primeira) de cada figurinha
-        repetida.
-        '''
-        string = '['
-        i = 0
-        # adiciona o primeiro elemento válido
-        first_in = False
-        while not first_in and i < self.tot_stickers:
-            if self.stickers[i].quant > 1:
-                string += f'{str(self.stickers[i].code)} ({str(self.stickers[i].quant - 1)})'
-                first_in = True
-            i += 1
-        # adiciona demais elementos válidos
-        while i < self.tot_stickers:
-            if self.stickers[i].quant > 1:
-                string += f', {str(self.stickers[i].code)} ({str(self.stickers[i].quant - 1)})'
-            i += 1
-        return string + ']'
-    
+    def iter_stickers(self, offset: int = 0,
+                      limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Percorre as figurinhas da coleção em ordem crescente de código,
+        gerando os pares (código, quantidade além da primeira).
+
+        Com *offset* e *limit*, gera apenas até *limit* figurinhas a partir
+        da de posição *offset* (contando de 0).
+        '''
+        # As figurinhas ficam em ordem nas primeiras posições do array
+        end = self.tot_stickers if limit is None else min(offset + limit, self.tot_stickers)
+        for code, quant in self.stickers.items(offset, end):
+            yield code, quant - 1
+
+    def iter_repeats(self, offset: int = 0,
+                     limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Como iter_stickers(), mas gera apenas as figurinhas repetidas.
+        '''
+        end = None if limit is None else offset + limit
+        for code in self.duplicate_index[offset:end]:
+            yield code, self.stickers.quant(self.stickers.search(code, self.tot_stickers)) - 1
+
+    def apply_delta(self, delta: bytes | memoryview) -> None:
+        '''
+        Aplica as variações de *delta*, gerado por diff(), em uma única
+        passada pela coleção.
+        '''
+        max_unique, changes = decode_delta(delta)
+        if max_unique != self.max_unique:
+            raise ValueError('A diferença é de um álbum com outro número de figurinhas')
+        self.__apply(changes)
+
     def exchange(self, other: Collection) -> None:
         '''
         Realiza o máximo de trocas válidas possíveis entre a coleção e *other*.
@@ -238,61 +683,90 @@ class Collection:
         if self.max_unique != other.max_unique:
             raise ValueError('Quantidade de cartas únicas diferentes')
         
-        # Salvar indices das figurinhas que vão ser trocadas
-        self_to_other: list[int] = []
-        other_to_self: list[int] = []
-        self.__eligible_for_exchange(other, self_to_other, other_to_self)
-        
-        # Realizar trocas a partir do indice (inserção no fim)
-        i = 0
-        while i < len(self_to_other) and i < len(other_to_self):
-            self.__append(other.stickers[other_to_self[i]].code)
-            other.__remove_index(other_to_self[i])
-            other.__append(self.stickers[self_to_other[i]].code)
-            self.__remove_index(self_to_other[i])
-            i += 1
-
-        # Ordenar tudo
-        self.__sort(0, self.tot_stickers - 1)
-        other.__sort(0, other.tot_stickers - 1)
+        # Códigos das figurinhas que vão ser trocadas, calculados pelos bitsets
+        self_to_other, other_to_self = exchange_codes(self.owned, self.duplicated,
+                                                      other.owned, other.duplicated,
+                                                      self.duplicate_index,
+                                                      other.duplicate_index)
+        # As figurinhas enviadas eram repetidas, então continuam na coleção
+        for code in self_to_other:
+            self.__remove_index(self.__position(code)) #type: ignore
+        for code in other_to_self:
+            other.__remove_index(other.__position(code)) #type: ignore
+
+        # As recebidas são novas e já estão ordenadas: basta intercalar
+        self.__merge_new(other_to_self, [1] * len(other_to_self))
+        other.__merge_new(self_to_other, [1] * len(self_to_other))
     
+    @property
+    def capacity(self) -> int:
+        '''
+        Quantidade de figurinhas distintas que cabem na coleção sem realocar
+        o array.
+        '''
+        # Uma posição do array fica sempre livre
+        return len(self.stickers) - 1
+
+    def reserve(self, n: int) -> None:
+        '''
+        Garante espaço para *n* figurinhas distintas, realocando o array uma
+        única vez se necessário. A redução automática não deixa a capacidade
+        ficar abaixo de *n*.
+        '''
+        self.reserved = n
+        if self.capacity < n:
+            self.__resize(n + 1)
+
+    def shrink_to_fit(self) -> None:
+        '''
+        Reduz a capacidade ao número atual de figurinhas distintas e desfaz
+        a reserva feita por reserve().
+        '''
+        self.reserved = 0
+        length = max(self.tot_stickers + 1, INITIAL_ARRAY_SIZE)
+        if length != len(self.stickers):
+            self.__resize(length)
+
+    def memory_bytes(self) -> int:
+        '''
+        Estimativa dos bytes ocupados pelo array de figurinhas da coleção.
+        '''
+        return self.stickers.nbytes(self.tot_stickers)
+
     # MÉTODOS AUXILIARES
 
-    def __ordered_insert(self, code: int) -> None:
+    def __ordered_insert(self, pos: int, code: int) -> None:
         '''
-        Insere *code* de forma ordenada em *self.stickers*
+        Insere *code* na posição *pos* de *self.stickers*, deslocando os
+        elementos seguintes uma posição para a direita.
         Função auxiliar de insert().
         '''
         if self.__is_full():
-            self.__expand()
+            self.__expand(self.tot_stickers + 1)
         
-        # percorre a lista de trás pra frente
-        i = self.tot_stickers
-        inserted = False
-        while i >= 0 and not inserted:
-            if i == 0 or self.stickers[i-1].code < code:
-                self.stickers[i] = StickersGroup(code, 1)
-                inserted = True
-            else:
-                self.stickers[i] = self.stickers[i-1]
-            i -= 1
+        # desloca os elementos a partir de *pos* de uma só vez
+        self.stickers.insert_at(pos, code, 1, self.tot_stickers)
+
+    def __search(self, code: int) -> tuple[int, bool]:
+        '''
+        Busca binária da figurinha de código *code* dentro do agrupamento.
+
+        Retorna o par (i, encontrada): se a figurinha estiver no agrupamento,
+        i é a sua posição; caso contrário, i é a posição onde ela deveria
+        ser inserida para manter a ordem.
+        '''
+        i = self.stickers.search(code, self.tot_stickers)
+        return i, i < self.tot_stickers and self.stickers.code(i) == code
 
     def __position(self, code: int) -> int | None:
         '''
         Retorna a posição i da figurinha de código *code* dentro do agrupamento.
         Se ela não estiver no agrupamento, retorna None
         '''
-        position = None
-        # Procura se está na lista 
-        found = False
-        i = 0
-        while not found and i < self.tot_stickers:
-            # Se encontrar, atualiza __position e sai do loop
-            if self.stickers[i].code == code:
-                position = i
-                found = True
-            i += 1
-        return position
+        i, found = self.__search(code)
+        if not found:
+            return None
+        return i
     
     def __is_full(self) -> bool:
         '''
@@ -311,129 +785,122 @@ class Collection:
         '''
         return self.tot_stickers == 0
     
-    def __append(self, code: int) -> None:
+    def __apply(self, batch: list[tuple[int, int]]) -> None:
+        '''
+        Soma *delta* à quantidade de cada figurinha *code* dos pares
+        (code, delta) de *batch*, que devem estar em ordem crescente de código.
+        Figurinhas cuja quantidade chegar a 0 (ou menos) são removidas.
+
+        As quantidades das figurinhas existentes são alteradas no lugar; as
+        removidas saem em uma única compactação e as novas entram em uma
+        única intercalação.
+        '''
+        emptied: list[int] = []
+        new_codes: list[int] = []
+        new_quants: list[int] = []
+        for code, delta in batch:
+            pos, found = self.__search(code)
+            if found:
+                old = self.stickers.quant(pos)
+                quant = max(old + delta, 0)
+                self.stickers.add_quant(pos, quant - old)
+                self.__track(code, old, quant)
+                if quant == 0:
+                    emptied.append(pos)
+            elif delta > 0:
+                new_codes.append(code)
+                new_quants.append(delta)
+        if emptied:
+            self.__compact(emptied)
+        if new_codes:
+            self.__merge_new(new_codes, new_quants)
+        self.__shrink_if_sparse()
+
+    def __compact(self, positions: list[int]) -> None:
         '''
-        Insere um novo grupo de figurinhas de código *code* no final da coleção
+        Retira do array as figurinhas das posições *positions*, em ordem
+        crescente, movendo cada bloco entre elas uma única vez.
         '''
-        if self.__is_full():
-            self.__expand()
+        for k in range(len(positions)):
+            if k + 1 < len(positions):
+                end = positions[k + 1]
+            else:
+                end = self.tot_stickers
+            self.stickers.shift(positions[k] + 1, end, -(k + 1))
+        self.stickers.clear(self.tot_stickers - len(positions), self.tot_stickers)
+        self.tot_stickers -= len(positions)
+
+    def __load(self, codes: list[int], quants: list[int]) -> None:
+        '''
+        Preenche a coleção, que deve estar vazia, com as figurinhas de
+        *codes*, em ordem crescente, e as quantidades de *quants*.
+
+        Como a coleção está vazia, cada figurinha é escrita direto na sua
+        posição final, após uma única realocação.
+        '''
+        if self.capacity < len(codes):
+            self.__expand(len(codes))
+        for i in range(len(codes)):
+            self.stickers.set(i, codes[i], quants[i])
+            self.__track(codes[i], 0, quants[i])
+        self.tot_stickers = len(codes)
+
+    def __merge_new(self, codes: list[int], quants: list[int]) -> None:
+        '''
+        Insere as figurinhas de *codes*, com as quantidades de *quants*.
+        *codes* deve estar em ordem crescente e conter apenas figurinhas que
+        não estão na coleção.
+
+        A intercalação é feita de trás para frente: cada bloco de figurinhas
+        maiores que o código inserido é deslocado de uma só vez para a sua
+        posição final, então cada figurinha da coleção é movida no máximo
+        uma vez.
+        '''
+        if self.capacity < self.tot_stickers + len(codes):
+            self.__expand(self.tot_stickers + len(codes))
 
-        self.stickers[self.tot_stickers] = StickersGroup(code, 1)
-        self.tot_stickers += 1
+        end = self.tot_stickers
+        j = len(codes)
+        while j > 0:
+            j -= 1
+            pos = self.stickers.search(codes[j], end)
+            # Ainda faltam j figurinhas para entrar antes de *pos*
+            self.stickers.shift(pos, end, j + 1)
+            self.stickers.set(pos + j, codes[j], quants[j])
+            self.__track(codes[j], 0, quants[j])
+            end = pos
+        self.tot_stickers += len(codes)
     
     def __remove_index(self, index: int) -> None:
         '''
         Reduz em 1 a quantidade da figurinha que está na posição *index* da coleção.
         '''
-        self.stickers[index].quant -= 1   
+        quant = self.stickers.add_quant(index, -1)
+        self.__track(self.stickers.code(index), quant + 1, quant) #type: ignore
 
-    def __has_next(self, index: int) -> int:
+    def __expand(self, n: int) -> None:
         '''
-        Retorna True se o elemento na posição *index + 1* na coleção for válido,
-        ou seja, o valor do código da figurinha não é None.
+        Aumenta a capacidade da coleção para, pelo menos, *n* figurinhas
+        distintas, multiplicando-a por no mínimo *growth_factor*.
         '''
-        return self.stickers[index + 1].code is not None
-    
-    def __eligible_for_exchange(self, other: Collection, self_to_other: list[int], \
-                                other_to_self: list[int]) -> None:
-        '''
-        Busca os indices das figurinhas elegiveis para troca entre *self* e *other*.
-         - Os indices das figurinhas de *self* que podem ser enviadas para *other*
-        são salvos em *self_to_other*;
-         - Os indices das figurinhas de *other* que podem ser enviadas para *self*
-        são salvos em *other_to_self*.
-        '''
-        i_self = i_other = 0
-        while (self.__has_next(i_self) or other.__has_next(i_other)) \
-            and not self.__is_empty() and not other.__is_empty():
-
-            stk_self = self.stickers[i_self]
-            stk_other = other.stickers[i_other]
-            if stk_self.code == stk_other.code:
-                if self.__has_next(i_self):
-                    i_self += 1
-                if other.__has_next(i_other):
-                    i_other += 1
-            elif stk_self.code > stk_other.code and other.__has_next(i_other):
-                if stk_other.quant > 1:
-                    other_to_self.append(i_other)
-                i_other += 1
-            elif stk_self.code < stk_other.code and self.__has_next(i_self):
-                if stk_self.quant > 1:
-                    self_to_other.append(i_self)
-                i_self += 1
-            elif stk_self.code > stk_other.code and not other.__has_next(i_other):
-                if not last_item_is(other_to_self, i_other) and stk_other.quant > 1:
-                    other_to_self.append(i_other)
-                if stk_self.quant > 1:
-                    self_to_other.append(i_self)
-                i_self += 1
-            elif stk_self.code < stk_other.code and not self.__has_next(i_self):
-                if not last_item_is(self_to_other, i_self) and stk_self.quant > 1:
-                    self_to_other.append(i_self)
-                if stk_other.quant > 1:
-                    other_to_self.append(i_other)
-                i_other += 1
-            
-            if not self.__has_next(i_self) and not other.__has_next(i_other) and \
-                stk_self.code != stk_other.code:
-                    
-                if not last_item_is(self_to_other, i_self) \
-                    and self.stickers[i_self].quant > 1:
-
-                    self_to_other.append(i_self)
-                if not last_item_is(other_to_self, i_other) \
-                    and other.stickers[i_other].quant > 1:
-
-                    other_to_self.append(i_other)
-    
-    def __sort(self, start: int, end: int) -> None:
+        length = math.ceil(len(self.stickers) * self.growth_factor)
+        self.__resize(max(length, n + 1))
+
+    def __shrink_if_sparse(self) -> None:
         '''
-        Ordena os elementos das posições *start* até *end* da coleção em ordem
-        crescente dos códigos das figurinhas.
+        Reduz a capacidade da coleção se a ocupação ficou abaixo de
+        *shrink_threshold*, respeitando a capacidade reservada.
         '''
-        # Ordenação por Quick Sort
-        if start < end:
-            pivot = self.__partition(start, end)
-            self.__sort(start, pivot - 1)
-            self.__sort(pivot + 1, end)
-    
-    def __partition(self, start: int, end: int) -> int:
-        '''
-        Função auxiliar de __sort().
-        Retorna a posição do pivo na ordenação por quick sort.
-        '''
-        pivot = self.stickers[end]
-        # Valores menores que o pivo vão para direita 
-        # e maiores ou iguais vão para esquerda
-        i = start - 1
-        j = start
-        while j <= end - 1:
-            if self.stickers[j].code < pivot.code:
-                i += 1
-                temp = self.stickers[i]
-                self.stickers[i] = self.stickers[j]
-                self.stickers[j] = temp
-            j += 1
-        # Posiciona pivo na posição correta e retorna a posição dele
-        i += 1
-        temp = self.stickers[i]
-        self.stickers[i] = self.stickers[end]
-        self.stickers[end] = temp
-        return i
-    
-    def __expand(self) -> None:
+        if self.tot_stickers < self.capacity * self.shrink_threshold:
+            length = max(math.ceil(self.tot_stickers * self.growth_factor) + 1,
+                         self.reserved + 1, INITIAL_ARRAY_SIZE)
+            if length < len(self.stickers):
+                self.__resize(length)
+
+    def __resize(self, length: int) -> None:
         '''
-        Aumenta em 2x a capacidade máxima da coleção
+        Realoca o array de figurinhas com *length* posições.
         '''
-        old_size = len(self.stickers)
-        new = array(old_size * 2, StickersGroup(None, 0)) #type: ignore
-        for i in range(old_size):
-            new[i] = self.stickers[i]
-        self.stickers = new
-
-def last_item_is(lst: list[int], item: int) -> bool:
-    '''
-    Verifica se o último item de *lst* é *item*
-    '''
-    return not len(lst) == 0 and lst[-1] == item
+        self.stickers.resize(length, self.tot_stickers)
+        self.reallocations += 1
+        self.copied += self.tot_stickers
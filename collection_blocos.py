@@ -0,0 +1,577 @@
+from __future__ import annotations
+from bisect import bisect_left
+from bitset import Bitset, exchange_codes
+from fenwick import CodeRanks
+from snapshot import decode_delta
+from tad_collection import Collection as TadCollection, RenderCache, count_codes, merge_counts
+from typing import Iterable, Iterator
+
+# Número máximo de figurinhas distintas em cada bloco
+BLOCK_SIZE = 64
+
+class Block:
+    '''
+    Um nó de um encadeamento desenrolado: guarda um pequeno bloco de
+    figurinhas distintas, ordenadas pelo código, e a quantidade de cada uma.
+    '''
+
+    __slots__ = ('codes', 'units', 'next', 'previous')
+
+    codes : list[int]
+    units : list[int]
+    next : Block
+    previous : Block
+
+    def __init__(self, previous, codes, units, next) -> None:
+        self.codes = codes
+        self.units = units
+        self.next = next
+        self.previous = previous
+
+    def insert_next(self, blk : Block) -> None:
+        '''
+        insere um bloco na frente de sí
+        '''
+        self.next.previous = blk
+        blk.next = self.next
+        self.next = blk
+        blk.previous = self
+
+    def unlink(self) -> None:
+        '''
+        retira o bloco do encadeamento
+        '''
+        self.previous.next = self.next
+        self.next.previous = self.previous
+
+class Collection(TadCollection):
+    '''
+    Uma coleção de figurinhas de um determinado álbum.
+    Indica quais e quantas figurinhas o colecionador possui, além
+    do máximo de figurinhas distintas que o álbum tem.
+
+    As figurinhas ficam em um encadeamento desenrolado: cada nó é um bloco
+    com até *block_size* figurinhas ordenadas, então os percursos visitam
+    poucos objetos. Uma lista com o maior código de cada bloco, em ordem,
+    localiza o bloco de um código por busca binária.
+
+    Exemplos:
+    >>> a = Collection(60)
+    >>> a.str_stickers()
+    '[]'
+    >>> a.str_repeat()
+    '[]'
+    >>> # Testando inserir e remover figurinhas dentro do intervalo
+    >>> a.insert(3)
+    >>> a.str_stickers()
+    '[3]'
+    >>> a.insert(41)
+    >>> a.insert(29)
+    >>> a.insert(3)
+    >>> a.str_repeat()
+    '[3 (1)]'
+    >>> a.insert(3)
+    >>> a.insert(54)
+    >>> a.insert(29)
+    >>> a.str_stickers()
+    '[3, 29, 41, 54]'
+    >>> a.str_repeat()
+    '[3 (2), 29 (1)]'
+    >>> a.remove(29)
+    >>> a.remove(3)
+    >>> a.remove(41)
+    >>> a.remove(60) # não está na coleção, então nada deve ocorrer
+    >>> a.str_stickers()
+    '[3, 29, 54]'
+    >>> a.str_repeat()
+    '[3 (1)]'
+    >>> # Testando inserir e remover fora do intervalo
+    >>> # Essas operações não podem alterar a coleção
+    >>> a.insert(-1)
+    >>> a.insert(61)
+    >>> a.remove(-4)
+    >>> a.remove(72)
+    >>> a.str_stickers()
+    '[3, 29, 54]'
+    >>> a.str_repeat()
+    '[3 (1)]'
+    >>> # Testndo troca de figurinhas
+    >>> a.insert(3)
+    >>> a.insert(12)
+    >>> a.insert(54)
+    >>> a.insert(54)
+    >>> a.insert(33)
+    >>> a.insert(41)
+    >>> a.insert(60)
+    >>> a.insert(60)
+    >>> a.insert(60)
+    >>> a.str_stickers()
+    '[3, 12, 29, 33, 41, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> b = Collection(60)
+    >>> b.str_stickers()
+    '[]'
+    >>> # Nenhuma das trocas devem alterar as coleções
+    >>> # Pois b não possui figurinhas para trocar.
+    >>> a.exchange(b)
+    >>> b.exchange(a)
+    >>> a.str_stickers()
+    '[3, 12, 29, 33, 41, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> b.str_stickers()
+    '[]'
+    >>> b.insert(12)
+    >>> b.insert(51)
+    >>> b.insert(9)
+    >>> b.insert(0)
+    >>> b.str_stickers()
+    '[0, 9, 12, 51]'
+    >>> b.str_repeat()
+    '[]'
+    >>> # b ainda não poderá trocar
+    >>> a.exchange(b)
+    >>> b.exchange(a)
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> b.str_stickers()
+    '[0, 9, 12, 51]'
+    >>> b.insert(0)
+    >>> b.insert(12)
+    >>> b.insert(51)
+    >>> b.insert(51)
+    >>> b.str_stickers()
+    '[0, 9, 12, 51]'
+    >>> b.str_repeat()
+    '[0 (1), 12 (1), 51 (2)]'
+    >>> a.str_stickers()
+    '[3, 12, 29, 33, 41, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> # Serão realizadas 2 trocas ente a e b.
+    >>> # a enviará 3 e 54
+    >>> # b enviará 0 e 51
+    >>> # mesmo que 12 seja repetida em b, não será
+    >>> # enviada, porque a já possui uma 12
+    >>> a.exchange(b)
+    >>> a.str_stickers()
+    '[0, 3, 12, 29, 33, 41, 51, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (1), 54 (1), 60 (2)]'
+    >>> b.str_stickers()
+    '[0, 3, 9, 12, 51, 54]'
+    >>> b.str_repeat()
+    '[12 (1), 51 (1)]'
+    >>> # Blocos pequenos para testar divisão e junção
+    >>> c = Collection(60, block_size=4)
+    >>> for code in [8, 1, 5, 3, 7, 2, 6, 4, 4]:
+    ...     c.insert(code)
+    >>> c.blocks()
+    [[1, 2, 3], [4, 5], [6, 7, 8]]
+    >>> c.str_repeat()
+    '[4 (1)]'
+    >>> for code in [3, 4, 4]:
+    ...     c.remove(code)
+    >>> c.blocks()
+    [[1, 2], [5, 6, 7, 8]]
+    >>> for code in [5, 6, 7]:
+    ...     c.remove(code)
+    >>> c.blocks()
+    [[1, 2, 8]]
+    >>> c.have(8), c.have(4)
+    (True, False)
+    >>> d = Collection(60, block_size=4)
+    >>> d.insert_queue([1, 4, 9, 16, 25], 5)
+    >>> d.blocks()
+    [[1, 4], [9, 16, 25]]
+    >>> # Inserções e remoções em lote
+    >>> d.insert_many([2, 3, 5, 6, 5, 61])
+    >>> d.blocks()
+    [[1, 2, 3, 4], [5, 6], [9, 16, 25]]
+    >>> d.remove_many([1, 2, 3, 4, 5, 9])
+    >>> d.blocks()
+    [[5, 6], [16, 25]]
+    >>> d.str_repeat()
+    '[]'
+    >>> Collection(60).exchange(Collection(61))
+    Traceback (most recent call last):
+    ...
+    ValueError: Quantidade de cartas únicas diferentes
+    >>> # Sincronização por diferenças
+    >>> e = Collection(60, block_size=4)
+    >>> e.insert_many([2, 4, 6, 8, 10, 16, 16])
+    >>> e.apply_delta(e.diff(d))
+    >>> e.blocks(), e.str_repeat()
+    ([[5, 6, 16, 25]], '[]')
+    '''
+    # Máximo de figurinhas únicas
+    max_unique : int
+    # Total de figurinhas únicas
+    tot_stickers : int
+    # Total de unidades de figurinhas, contando as repetidas
+    tot_units : int
+    # Códigos das figurinhas repetidas, em ordem crescente
+    duplicate_index : list[int]
+    # Contagens por intervalo de códigos, criadas na primeira consulta
+    ranks : CodeRanks | None
+    # Máximo de figurinhas distintas por bloco
+    block_size : int
+    # Sentinela do encadeamento circular de blocos
+    sentinel : Block
+    # Blocos na ordem do encadeamento
+    index : list[Block]
+    # Maior código de cada bloco de *index*, na mesma posição
+    lasts : list[int]
+    # Figurinhas que a coleção possui
+    owned : Bitset
+    # Figurinhas que a coleção possui repetidas
+    duplicated : Bitset
+    # Número da versão da coleção, que muda a cada alteração
+    version : int
+    # Textos de str_stickers() e str_repeat() guardados entre as alterações
+    cache : RenderCache
+
+    def __init__(self, unique: int, block_size: int = BLOCK_SIZE,
+                 cache_limit: int | None = None) -> None:
+        '''
+        Cria uma coleção em relação a um álbum com *unique* figurinhas únicas,
+        ou seja, os códigos das figurinhas variam de 0 a *unique*.
+
+        Cada bloco guarda até *block_size* figurinhas distintas.
+
+        Os textos de str_stickers() e str_repeat() são guardados até a
+        próxima alteração da coleção, exceto os com mais de *cache_limit*
+        caracteres; None não impõe limite.
+        '''
+        if block_size < 2:
+            raise ValueError('Os blocos devem ter espaço para pelo menos 2 figurinhas')
+        self.max_unique = unique
+        self.tot_stickers = 0
+        self.tot_units = 0
+        self.duplicate_index = []
+        self.ranks = None
+        self.block_size = block_size
+        self.sentinel = Block(None, [], [], None)
+        self.sentinel.next = self.sentinel
+        self.sentinel.previous = self.sentinel
+        self.index = []
+        self.lasts = []
+        self.owned = Bitset(unique + 1)
+        self.duplicated = Bitset(unique + 1)
+        self.version = 0
+        self.cache = RenderCache(cache_limit)
+
+    def insert(self, code: int) -> None:
+        '''
+        Aumenta em 1 a quantidade da figurinha de código *code*.
+
+        Se ela não estiver na coleção, a figurinha é adicionada.
+        Se a figurinha não estiver no intervalo das possíveis figurinhas
+        do álbum, nada acontece.
+        '''
+        if code > self.max_unique or code < 0:
+            return None
+        self.__add(self.__locate(code), code)
+
+    def remove(self, code: int) -> None:
+        '''
+        Reduz em 1 a quantidade da figurinha de código *code*.
+
+        Se a quantidade da figurinha reduzir para 0, ela é removida
+        da coleção. Se a figurinha não estiver na coleção, nada acontece.
+        '''
+        self.__take(self.__locate(code), code, 1)
+
+    def have(self, code: int) -> bool:
+        '''
+        Retorna True se a figurinha de código *code* está na coleção.
+        Retorna False em caso contrário.
+        '''
+        return 0 <= code <= self.max_unique and code in self.owned
+
+    def insert_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar insert() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os junta à coleção em uma só passada.
+        '''
+        blk = self.sentinel.next
+        for code, count in count_codes(codes, self.max_unique):
+            blk = self.__add(self.__find(blk, code), code, count)
+
+    def insert_counts(self, pairs: Iterable[tuple[int, int]]) -> None:
+        '''
+        Equivale a chamar insert() *count* vezes para cada par (code, count)
+        de *pairs*, sem expandir as quantidades, percorrendo os blocos uma
+        única vez.
+        '''
+        blk = self.sentinel.next
+        for code, count in merge_counts(pairs, self.max_unique):
+            blk = self.__add(self.__find(blk, code), code, count)
+
+    def remove_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar remove() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os retira da coleção em uma só passada.
+        '''
+        blk = self.sentinel.next
+        for code, count in count_codes(codes, self.max_unique):
+            blk = self.__find(blk, code)
+            # O bloco anterior continua no encadeamento mesmo que *blk* saia
+            previous = blk.previous
+            self.__take(blk, code, count)
+            blk = previous if previous is not self.sentinel else self.sentinel.next
+
+    def iter_stickers(self, offset: int = 0,
+                      limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Percorre as figurinhas da coleção em ordem crescente de código,
+        gerando os pares (código, quantidade além da primeira).
+
+        Com *offset* e *limit*, gera apenas até *limit* figurinhas a partir
+        da de posição *offset* (contando de 0). A primeira figurinha da
+        página e o seu bloco são localizados em O(log n), e as seguintes
+        são lidas em sequência.
+        '''
+        if offset == 0:
+            blk, i = self.sentinel.next, 0
+        else:
+            code = self.__code_ranks().select(offset)
+            if code is None:
+                return
+            blk = self.__locate(code)
+            i = bisect_left(blk.codes, code)
+        count = 0
+        while blk is not self.sentinel and (limit is None or count < limit):
+            if i == len(blk.codes):
+                blk, i = blk.next, 0
+            else:
+                yield blk.codes[i], blk.units[i] - 1
+                i += 1
+                count += 1
+
+    def iter_repeats(self, offset: int = 0,
+                     limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Como iter_stickers(), mas gera apenas as figurinhas repetidas. Os
+        códigos da página saem do índice de repetidas, e o bloco de cada um
+        é localizado por busca binária quando não é o da figurinha anterior.
+        '''
+        end = None if limit is None else offset + limit
+        blk = self.sentinel
+        for code in self.duplicate_index[offset:end]:
+            if blk is self.sentinel or blk.codes[-1] < code:
+                blk = self.__locate(code)
+            yield code, blk.units[bisect_left(blk.codes, code)] - 1
+
+    def apply_delta(self, delta: bytes | memoryview) -> None:
+        '''
+        Aplica as variações de *delta*, gerado por diff(), percorrendo os
+        blocos uma única vez.
+        '''
+        max_unique, changes = decode_delta(delta)
+        if max_unique != self.max_unique:
+            raise ValueError('A diferença é de um álbum com outro número de figurinhas')
+        blk = self.sentinel.next
+        for code, change in changes:
+            blk = self.__find(blk, code)
+            if change > 0:
+                blk = self.__add(blk, code, change)
+            else:
+                # O bloco anterior continua no encadeamento mesmo que *blk* saia
+                previous = blk.previous
+                self.__take(blk, code, -change)
+                blk = previous if previous is not self.sentinel else self.sentinel.next
+
+    def exchange(self, other: Collection) -> None:
+        '''
+        Realiza o máximo de trocas válidas possíveis entre a coleção e *other*.
+
+        Uma troca válida acontece quando uma coleção tem uma carta repetida
+        que a outra não tem ao mesmo tempo que essa outra possui uma carta
+        repetida que a primeira também não tenha.
+
+        As figurinhas de menor código tem prioridade na troca.
+
+        Requer que *other* seja uma coleção com o mesmo número de cartas únicas
+        '''
+        if self.owned.size != other.owned.size:
+            raise ValueError('Quantidade de cartas únicas diferentes')
+
+        self_to_other, other_to_self = exchange_codes(self.owned, self.duplicated,
+                                                      other.owned, other.duplicated,
+                                                      self.duplicate_index,
+                                                      other.duplicate_index)
+        self.__give(self_to_other)
+        other.__give(other_to_self)
+        self.insert_queue(other_to_self, len(other_to_self))
+        other.insert_queue(self_to_other, len(self_to_other))
+
+    def insert_queue(self, codes: Iterable[int], n: int) -> None:
+        '''
+        Insere na coleção uma unidade de cada uma das *n* primeiras figurinhas
+        de *codes*, que devem estar em ordem crescente.
+
+        Os blocos são percorridos uma única vez.
+        '''
+        blk = self.sentinel.next
+        for code in codes:
+            if n == 0:
+                return None
+            blk = self.__add(self.__find(blk, code), code)
+            n -= 1
+
+    def blocks(self) -> list[list[int]]:
+        '''
+        Devolve os códigos de cada bloco, na ordem do encadeamento.
+        '''
+        codes = []
+        blk = self.sentinel.next
+        while blk is not self.sentinel:
+            codes.append(blk.codes[:])
+            blk = blk.next
+        return codes
+
+    def __load(self, codes: list[int], quants: list[int]) -> None:
+        '''
+        Preenche a coleção, que deve estar vazia, com as figurinhas de
+        *codes*, em ordem crescente, e as quantidades de *quants*.
+        '''
+        for start in range(0, len(codes), self.block_size):
+            blk = Block(None, codes[start:start + self.block_size],
+                        quants[start:start + self.block_size], None)
+            self.sentinel.previous.insert_next(blk)
+            self.index.append(blk)
+            self.lasts.append(blk.codes[-1])
+            self.tot_stickers += len(blk.codes)
+            for code, units in zip(blk.codes, blk.units):
+                self.__track(code, 0, units)
+
+    def __locate(self, code: int) -> Block:
+        '''
+        Devolve o primeiro bloco cujo maior código é maior ou igual a
+        *code*, ou o último bloco se não houver, por busca binária em
+        *lasts*. Se a coleção estiver vazia, devolve o sentinela.
+        '''
+        if not self.index:
+            return self.sentinel
+        return self.index[min(bisect_left(self.lasts, code), len(self.index) - 1)]
+
+    def __find(self, blk: Block, code: int) -> Block:
+        '''
+        A partir de *blk*, devolve o primeiro bloco cujo maior código é maior
+        ou igual a *code*, ou o último bloco se não houver. Se a coleção
+        estiver vazia, devolve o sentinela.
+        '''
+        while blk.next is not self.sentinel and blk.codes[-1] < code:
+            blk = blk.next
+        return blk
+
+    def __add(self, blk: Block, code: int, count: int = 1) -> Block:
+        '''
+        Aumenta em *count* a quantidade de *code* no bloco *blk*, que deve ser
+        o bloco onde ele está ou deveria estar.
+
+        Devolve o bloco que contém *code* depois da operação, que pode ser
+        um bloco novo.
+        '''
+        if blk is self.sentinel:
+            blk = Block(None, [], [], None)
+            self.sentinel.insert_next(blk)
+            self.index.append(blk)
+            self.lasts.append(code)
+        i = bisect_left(blk.codes, code)
+        if i < len(blk.codes) and blk.codes[i] == code:
+            old = blk.units[i]
+            blk.units[i] += count
+        else:
+            old = 0
+            if blk.codes and i == len(blk.codes):
+                # *code* passa a ser o maior código do bloco
+                self.lasts[bisect_left(self.lasts, blk.codes[-1])] = code
+            blk.codes.insert(i, code)
+            blk.units.insert(i, count)
+            self.tot_stickers += 1
+        self.__track(code, old, blk.units[i])
+        if len(blk.codes) > self.block_size:
+            self.__split(blk)
+            if blk.codes[-1] < code:
+                blk = blk.next
+        return blk
+
+    def __take(self, blk: Block, code: int, count: int) -> None:
+        '''
+        Reduz em até *count* a quantidade de *code* no bloco *blk*, que deve
+        ser o bloco onde ele está ou deveria estar. Se a quantidade chegar a
+        0, a figurinha sai do bloco.
+        '''
+        i = bisect_left(blk.codes, code)
+        if i < len(blk.codes) and blk.codes[i] == code:
+            old = blk.units[i]
+            blk.units[i] = max(old - count, 0)
+            self.__track(code, old, blk.units[i])
+            if blk.units[i] == 0:
+                pos = bisect_left(self.lasts, blk.codes[-1])
+                del blk.codes[i]
+                del blk.units[i]
+                self.tot_stickers -= 1
+                if blk.codes:
+                    self.lasts[pos] = blk.codes[-1]
+                self.__underflow(blk, pos)
+
+    def __give(self, codes: list[int]) -> None:
+        '''
+        Reduz em 1 a quantidade das figurinhas repetidas de *codes*, que deve
+        estar em ordem crescente, percorrendo os blocos uma única vez.
+        '''
+        blk = self.sentinel.next
+        for code in codes:
+            blk = self.__find(blk, code)
+            i = bisect_left(blk.codes, code)
+            blk.units[i] -= 1
+            self.__track(code, blk.units[i] + 1, blk.units[i])
+
+    def __split(self, blk: Block) -> None:
+        '''
+        Divide o bloco cheio *blk* em dois blocos com metade das figurinhas.
+        '''
+        pos = bisect_left(self.lasts, blk.codes[-1])
+        half = len(blk.codes) // 2
+        new = Block(None, blk.codes[half:], blk.units[half:], None)
+        del blk.codes[half:]
+        del blk.units[half:]
+        blk.insert_next(new)
+        self.lasts.insert(pos, blk.codes[-1])
+        self.index.insert(pos + 1, new)
+
+    def __underflow(self, blk: Block, pos: int) -> None:
+        '''
+        Depois de uma remoção em *blk*, que está na posição *pos* de *index*,
+        descarta o bloco se ficou vazio. Se ficou com menos da metade da
+        capacidade, junta com um vizinho quando os dois cabem em um único
+        bloco.
+        '''
+        if not blk.codes:
+            blk.unlink()
+            del self.index[pos]
+            del self.lasts[pos]
+        elif len(blk.codes) < self.block_size // 2:
+            if blk.next is not self.sentinel \
+                and len(blk.codes) + len(blk.next.codes) <= self.block_size:
+
+                self.__merge(blk, blk.next, pos)
+            elif blk.previous is not self.sentinel \
+                and len(blk.codes) + len(blk.previous.codes) <= self.block_size:
+
+                self.__merge(blk.previous, blk, pos - 1)
+
+    def __merge(self, blk: Block, nxt: Block, pos: int) -> None:
+        '''
+        Move as figurinhas de *nxt* para o seu bloco anterior *blk*, que está
+        na posição *pos* de *index*, e retira *nxt* do encadeamento.
+        '''
+        blk.codes.extend(nxt.codes)
+        blk.units.extend(nxt.units)
+        nxt.unlink()
+        del self.index[pos + 1]
+        del self.lasts[pos]
@@ -0,0 +1,400 @@
+from __future__ import annotations
+from array import array
+from bitset import Bitset, exchange_codes
+from fenwick import CodeRanks
+from snapshot import decode_delta
+from tad_collection import Collection as TadCollection, RenderCache
+from typing import Iterable, Iterator
+
+class Collection(TadCollection):
+    '''
+    Uma coleção de figurinhas de um determinado álbum.
+    Indica quais e quantas figurinhas o colecionador possui, além
+    do máximo de figurinhas distintas que o álbum tem.
+
+    Como os códigos das figurinhas variam de 0 a *max_unique*, a coleção
+    guarda um contador por código em um array tipado compacto. Assim,
+    insert, remove e have são O(1), e as representações em string são
+    geradas em uma única passada pelos contadores.
+
+    Exemplos:
+    >>> a = Collection(60)
+    >>> a.str_stickers()
+    '[]'
+    >>> a.str_repeat()
+    '[]'
+    >>> # Testando inserir e remover figurinhas dentro do intervalo
+    >>> a.insert(3)
+    >>> a.str_stickers()
+    '[3]'
+    >>> a.insert(41)
+    >>> a.insert(29)
+    >>> a.insert(3)
+    >>> a.str_repeat()
+    '[3 (1)]'
+    >>> a.insert(3)
+    >>> a.insert(54)
+    >>> a.insert(29)
+    >>> a.str_stickers()
+    '[3, 29, 41, 54]'
+    >>> a.str_repeat()
+    '[3 (2), 29 (1)]'
+    >>> a.remove(29)
+    >>> a.remove(3)
+    >>> a.remove(41)
+    >>> a.remove(60) # não está na coleção, então nada deve ocorrer
+    >>> a.str_stickers()
+    '[3, 29, 54]'
+    >>> a.str_repeat()
+    '[3 (1)]'
+    >>> # Testando inserir e remover fora do intervalo
+    >>> # Essas operações não podem alterar a coleção
+    >>> a.insert(-1)
+    >>> a.insert(61)
+    >>> a.remove(-4)
+    >>> a.remove(72)
+    >>> a.str_stickers()
+    '[3, 29, 54]'
+    >>> a.str_repeat()
+    '[3 (1)]'
+    >>> # Testndo troca de figurinhas
+    >>> a.insert(3)
+    >>> a.insert(12)
+    >>> a.insert(54)
+    >>> a.insert(54)
+    >>> a.insert(33)
+    >>> a.insert(41)
+    >>> a.insert(60)
+    >>> a.insert(60)
+    >>> a.insert(60)
+    >>> a.str_stickers()
+    '[3, 12, 29, 33, 41, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> b = Collection(60)
+    >>> b.str_stickers()
+    '[]'
+    >>> # Nenhuma das trocas devem alterar as coleções
+    >>> # Pois b não possui figurinhas para trocar.
+    >>> a.exchange(b)
+    >>> b.exchange(a)
+    >>> a.str_stickers()
+    '[3, 12, 29, 33, 41, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> b.str_stickers()
+    '[]'
+    >>> b.insert(12)
+    >>> b.insert(51)
+    >>> b.insert(9)
+    >>> b.insert(0)
+    >>> b.str_stickers()
+    '[0, 9, 12, 51]'
+    >>> b.str_repeat()
+    '[]'
+    >>> # b ainda não poderá trocar
+    >>> a.exchange(b)
+    >>> b.exchange(a)
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> b.str_stickers()
+    '[0, 9, 12, 51]'
+    >>> b.insert(0)
+    >>> b.insert(12)
+    >>> b.insert(51)
+    >>> b.insert(51)
+    >>> b.str_stickers()
+    '[0, 9, 12, 51]'
+    >>> b.str_repeat()
+    '[0 (1), 12 (1), 51 (2)]'
+    >>> a.str_stickers()
+    '[3, 12, 29, 33, 41, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (2), 54 (2), 60 (2)]'
+    >>> # Serão realizadas 2 trocas ente a e b.
+    >>> # a enviará 3 e 54
+    >>> # b enviará 0 e 51
+    >>> # mesmo que 12 seja repetida em b, não será
+    >>> # enviada, porque a já possui uma 12
+    >>> a.exchange(b)
+    >>> a.str_stickers()
+    '[0, 3, 12, 29, 33, 41, 51, 54, 60]'
+    >>> a.str_repeat()
+    '[3 (1), 54 (1), 60 (2)]'
+    >>> b.str_stickers()
+    '[0, 3, 9, 12, 51, 54]'
+    >>> b.str_repeat()
+    '[12 (1), 51 (1)]'
+    >>> # Testando a verificação de posse
+    >>> b.have(54)
+    True
+    >>> b.have(60)
+    False
+    >>> b.have(61)
+    False
+    >>> # Figurinhas que faltam
+    >>> b.missing_in_range(0, 12)
+    [1, 2, 4, 5, 6, 7, 8, 10, 11]
+    >>> b.next_missing(11), b.next_missing(60), b.prev_owned(51)
+    (13, None, 12)
+    >>> len(list(b.iter_missing())) == b.missing
+    True
+    >>> # Sincronização por diferenças
+    >>> c = Collection(60)
+    >>> c.insert(9)
+    >>> c.apply_delta(c.diff(b))
+    >>> c.str_stickers(), c.str_repeat()
+    ('[0, 3, 9, 12, 51, 54]', '[12 (1), 51 (1)]')
+    '''
+    # Total de figurinhas únicas
+    tot_stickers: int
+    # Total de unidades de figurinhas, contando as repetidas
+    tot_units: int
+    # Códigos das figurinhas repetidas, em ordem crescente
+    duplicate_index: list[int]
+    # Contagens por intervalo de códigos, criadas na primeira consulta
+    ranks: CodeRanks | None
+    # Máximo de figurinhas únicas
+    max_unique: int
+    # Quantidade de cada figurinha, indexada pelo código
+    counts: array | memoryview
+    # Se *counts* não pode ser alterado, como nas coleções de um
+    # armazenamento aberto apenas para leitura
+    readonly: bool
+    # Figurinhas que a coleção possui
+    owned: Bitset
+    # Figurinhas que a coleção possui repetidas
+    duplicated: Bitset
+    # Número da versão da coleção, que muda a cada alteração
+    version: int
+    # Textos de str_stickers() e str_repeat() guardados entre as alterações
+    cache: RenderCache
+
+    # MÉTODOS PRINCIPAIS
+
+    def __init__(self, max_unique: int, cache_limit: int | None = None,
+                 counts: array | memoryview | None = None) -> None:
+        '''
+        Cria uma coleção em relação a um álbum com *max_unique* figurinhas únicas,
+        ou seja, os códigos das figurinhas variam de 0 a *max_unique*.
+
+        Os textos de str_stickers() e str_repeat() são guardados até a
+        próxima alteração da coleção, exceto os com mais de *cache_limit*
+        caracteres; None não impõe limite.
+
+        Se *counts* for dado, a coleção usa esse vetor de quantidades, com
+        *max_unique* + 1 inteiros sem sinal, em vez de criar um vazio, e as
+        alterações são feitas direto nele. É assim que as coleções de
+        population_store.PopulationStore trabalham sobre o arquivo mapeado.
+        Se o vetor for somente leitura, as operações que alteram a coleção
+        levantam ValueError sem alterar nada.
+        '''
+        if counts is None:
+            counts = array('I', [0]) * (max_unique + 1)
+        elif len(counts) != max_unique + 1:
+            raise ValueError('O vetor de quantidades deve ter max_unique + 1 posições')
+        self.max_unique = max_unique
+        self.tot_stickers = 0
+        self.tot_units = 0
+        self.duplicate_index = []
+        self.ranks = None
+        self.counts = counts
+        self.readonly = isinstance(counts, memoryview) and counts.readonly
+        self.owned = Bitset(max_unique + 1)
+        self.duplicated = Bitset(max_unique + 1)
+        self.version = 0
+        self.cache = RenderCache(cache_limit)
+        self.__index_counts()
+
+    def insert(self, code: int) -> None:
+        '''
+        Aumenta em 1 a quantidade da figurinha de código *code*.
+
+        Se ela não estiver na coleção, a figurinha é adicionada.
+        Se a figurinha não estiver no intervalo das possíveis figurinhas
+        do álbum, nada acontece.
+        '''
+        self.__check_writable()
+        if self.__valid(code):
+            self.__change(code, 1)
+
+    def remove(self, code: int) -> None:
+        '''
+        Reduz em 1 a quantidade da figurinha de código *code*.
+
+        Se a quantidade da figurinha reduzir para 0, ela é removida
+        da coleção. Se a figurinha não estiver na coleção, nada acontece.
+        '''
+        self.__check_writable()
+        if self.have(code):
+            self.__change(code, -1)
+
+    def have(self, code: int) -> bool:
+        '''
+        Retorna True se a figurinha de código *code* está na coleção.
+        Retorna False em caso contrário.
+        '''
+        return self.__valid(code) and self.counts[code] > 0
+
+    def insert_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar insert() para cada código de *codes*. Como cada
+        inserção é O(1), não é preciso ordenar os códigos.
+        '''
+        self.__check_writable()
+        for code in codes:
+            self.insert(code)
+
+    def insert_counts(self, pairs: Iterable[tuple[int, int]]) -> None:
+        '''
+        Equivale a chamar insert() *count* vezes para cada par (code, count)
+        de *pairs*, somando cada quantidade de uma vez.
+        '''
+        self.__check_writable()
+        for code, count in pairs:
+            if self.__valid(code) and count > 0:
+                self.__change(code, count)
+
+    def remove_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar remove() para cada código de *codes*. Como cada
+        remoção é O(1), não é preciso ordenar os códigos.
+        '''
+        self.__check_writable()
+        for code in codes:
+            self.remove(code)
+
+    def iter_stickers(self, offset: int = 0,
+                      limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Percorre as figurinhas da coleção em ordem crescente de código,
+        gerando os pares (código, quantidade além da primeira).
+
+        Com *offset* e *limit*, gera apenas até *limit* figurinhas a partir
+        da de posição *offset* (contando de 0).
+        '''
+        if offset == 0 and limit is None:
+            for code, quant in enumerate(self.counts):
+                if quant > 0:
+                    yield code, quant - 1
+            return
+        # Só a primeira figurinha da página é localizada pelas contagens; as
+        # seguintes saem do bitset, pulando as palavras vazias
+        current = self.__code_ranks().select(offset)
+        count = 0
+        while current is not None and (limit is None or count < limit):
+            yield current, self.counts[current] - 1
+            count += 1
+            current = self.owned.next_set(current + 1)
+
+    def iter_repeats(self, offset: int = 0,
+                     limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Como iter_stickers(), mas gera apenas as figurinhas repetidas.
+        '''
+        end = None if limit is None else offset + limit
+        for code in self.duplicate_index[offset:end]:
+            yield code, self.counts[code] - 1
+
+    def apply_delta(self, delta: bytes | memoryview) -> None:
+        '''
+        Aplica as variações de *delta*, gerado por diff(). Cada código é
+        alterado uma única vez, com a variação inteira.
+        '''
+        self.__check_writable()
+        max_unique, changes = decode_delta(delta)
+        if max_unique != self.max_unique:
+            raise ValueError('A diferença é de um álbum com outro número de figurinhas')
+        for code, change in changes:
+            self.__change(code, change)
+
+    def exchange(self, other: Collection) -> None:
+        '''
+        Realiza o máximo de trocas válidas possíveis entre a coleção e *other*.
+
+        Uma troca válida acontece quando uma coleção tem uma carta repetida
+        que a outra não tem ao mesmo tempo que essa outra possui uma carta
+        repetida que a primeira também não tenha.
+
+        As figurinhas de menor código tem prioridade na troca.
+
+        Requer que *other* seja uma coleção com o mesmo número de cartas únicas
+        '''
+        if self.max_unique != other.max_unique:
+            raise ValueError('Quantidade de cartas únicas diferentes')
+        # As duas coleções são alteradas; nenhuma troca é feita se uma
+        # delas for somente leitura
+        self.__check_writable()
+        if getattr(other, 'readonly', False):
+            raise ValueError('A coleção é somente leitura')
+
+        self_to_other, other_to_self = exchange_codes(self.owned, self.duplicated,
+                                                      other.owned, other.duplicated,
+                                                      self.duplicate_index,
+                                                      other.duplicate_index)
+        for sent, received in zip(self_to_other, other_to_self):
+            self.remove(sent)
+            other.insert(sent)
+            other.remove(received)
+            self.insert(received)
+
+    # MÉTODOS AUXILIARES
+
+    def __load(self, codes: list[int], quants: list[int]) -> None:
+        '''
+        Preenche a coleção, que deve estar vazia, com as figurinhas de
+        *codes*, em ordem crescente, e as quantidades de *quants*.
+        '''
+        for code, quant in zip(codes, quants):
+            self.counts[code] = quant
+            self.owned.add(code)
+            if quant > 1:
+                self.duplicated.add(code)
+                self.duplicate_index.append(code)
+        self.tot_stickers = len(codes)
+        self.tot_units = sum(quants)
+        self.version += 1
+
+    def __change(self, code: int, change: int) -> None:
+        '''
+        Soma *change* à quantidade da figurinha de código *code*, sem deixá-la
+        negativa, e atualiza os totais, os bitsets e o índice de repetidas.
+
+        A quantidade é gravada antes dos totais, para que uma falha na
+        gravação não deixe a coleção inconsistente.
+        '''
+        old = self.counts[code]
+        quant = max(old + change, 0)
+        if quant == old:
+            return
+        self.counts[code] = quant
+        self.tot_stickers += (quant > 0) - (old > 0)
+        self.__track(code, old, quant)
+
+    def __index_counts(self) -> None:
+        '''
+        Preenche os bitsets, o índice de repetidas e os totais a partir das
+        quantidades já presentes em *counts*.
+        '''
+        for code, quant in enumerate(self.counts):
+            if quant > 0:
+                self.tot_stickers += 1
+                self.tot_units += quant
+                self.owned.add(code)
+                if quant > 1:
+                    self.duplicated.add(code)
+                    self.duplicate_index.append(code)
+
+    def __check_writable(self) -> None:
+        '''
+        Levanta ValueError se a coleção for somente leitura.
+        '''
+        if self.readonly:
+            raise ValueError('A coleção é somente leitura')
+
+    def __valid(self, code: int) -> bool:
+        '''
+        Retorna True se *code* está no intervalo das figurinhas do álbum.
+        Retorna False, caso contrário.
+        '''
+        return 0 <= code <= self.max_unique
@@ -1,7 +1,20 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from bitset import Bitset, exchange_codes
+from fenwick import CodeRanks
+from snapshot import decode_delta
+from tad_collection import Collection as TadCollection, RenderCache, count_codes, merge_counts
+from typing import Iterable, Iterator
+import random
 
-@dataclass
+# Número máximo de níveis da skip list
+MAX_LEVEL = 32
+# Número máximo de nós guardados para reaproveitamento em cada coleção
+POOL_LIMIT = 1024
+# Número máximo de passos da busca a partir do último nó visitado
+FINGER_STEPS = 16
+
+@dataclass(slots=True)
 class No:
     '''Um nó em um encadeamento'''
     item: Sticker
@@ -20,22 +33,46 @@ class Fila:
     #     em inicio
     inicio: No | None
     fim: No | None
+    # Nós livres, reaproveitados por enfileira e devolvidos por desenfileira
+    livres: list[No]
+    # Máximo de nós guardados em *livres*
+    limite: int
+    # Coleção a que pertencem os Stickers enfileirados, se houver
+    dono: Collection | None
+
+    def __init__(self, livres: list[No] | None = None, limite: int = POOL_LIMIT,
+                 dono: Collection | None = None) -> None:
+        '''
+        Cria uma nova fila vazia.
+
+        Se *livres* for informada, os nós da fila são retirados dela sempre
+        que possível e devolvidos a ela quando deixam a fila, enquanto ela
+        tiver menos de *limite* nós.
 
-    def __init__(self) -> None:
-        '''Cria uma nova fila vazia'''
+        *dono* é a coleção de onde vêm os Stickers enfileirados: as unidades
+        que insert_queue() tirar deles são descontadas nela.
+        '''
         self.inicio = None
         self.fim = None
+        self.livres = livres if livres is not None else []
+        self.limite = limite
+        self.dono = dono
 
     def enfileira(self, item: Sticker):
         '''
         Adiciona *item* no final da fila.
         '''
+        if self.livres:
+            no = self.livres.pop()
+            no.item = item
+        else:
+            no = No(item, None)
         if self.fim is None:
             assert self.inicio is None
-            self.inicio = No(item, None)
+            self.inicio = no
             self.fim = self.inicio
         else:
-            self.fim.prox = No(item, None)
+            self.fim.prox = no
             self.fim = self.fim.prox
 
     def desenfileira(self) -> Sticker:
@@ -46,10 +83,15 @@ class Fila:
         '''
         if self.inicio is None:
             return None #type: ignore
-        item = self.inicio.item
-        self.inicio = self.inicio.prox
+        no = self.inicio
+        item = no.item
+        self.inicio = no.prox
         if self.inicio is None:
             self.fim = None
+        if len(self.livres) < self.limite:
+            no.item = None #type: ignore
+            no.prox = None
+            self.livres.append(no)
         return item
 
     def vazia(self) -> bool:
@@ -60,16 +102,35 @@ class Fila:
     
 class Sticker:
 
+    __slots__ = ('next', 'id', 'units', 'previous', 'skips')
+
     next : Sticker
     id :  int
     units : int
     previous : Sticker
+    # Atalhos da skip list: skips[k] é o próximo nó no nível k + 1
+    skips : list[Sticker]
 
-    def __init__(self, previous, id, units, next) -> None:
+    def __init__(self, previous, id, units, next, height = 1) -> None:
         self.id = id
         self.next = next
         self.previous = previous
         self.units = units
+        self.skips = [None] * (height - 1) #type: ignore
+
+    def forward(self, level : int) -> Sticker:
+        '''
+        Devolve o próximo nó no nível *level* da skip list
+        '''
+        if level == 0:
+            return self.next
+        return self.skips[level - 1]
+
+    def set_forward(self, level : int, stick : Sticker) -> None:
+        '''
+        Altera o próximo nó no nível *level* (maior que 0) da skip list
+        '''
+        self.skips[level - 1] = stick
     
     def insert_next(self, stick : Sticker) -> None:
         '''
@@ -80,7 +141,7 @@ class Sticker:
         self.next = stick
         stick.previous = self
 
-class Collection:
+class Collection(TadCollection):
     '''
     Uma coleção de figurinhas de um determinado álbum.
     Indica quais e quantas figurinhas o colecionador possui, além
@@ -194,23 +255,154 @@ class Collection:
     '[0, 3, 9, 12, 51, 54]'
     >>> b.str_repeat()
     '[12 (1), 51 (1)]'
+    >>> # Buscas perto da última figurinha visitada e longe dela
+    >>> c = Collection(1000, finger_steps=2)
+    >>> for code in [500, 501, 503, 10, 502, 999, 11]:
+    ...     c.insert(code)
+    >>> c.remove(503)
+    >>> c.have(502), c.have(503), c.have(10)
+    (True, False, True)
+    >>> c.str_stickers()
+    '[10, 11, 500, 501, 502, 999]'
+    >>> # Inserções e remoções em lote
+    >>> c.insert_many([502, 7, 1001, 502, 12, -1])
+    >>> c.remove_many([10, 11, 999, 999, 5])
+    >>> c.str_stickers()
+    '[7, 12, 500, 501, 502]'
+    >>> c.str_repeat()
+    '[502 (2)]'
+    >>> # Totais mantidos a cada alteração
+    >>> len(c), c.total_units, c.duplicate_codes, c.spare_units, c.missing
+    (5, 7, 1, 2, 996)
+    >>> a.exchange(b) # sem trocas possíveis
+    >>> len(a), a.total_units, len(b), b.total_units
+    (9, 13, 6, 8)
+    >>> # Contagens por intervalo de códigos e páginas
+    >>> a.count_owned(10, 50), a.count_units(10, 50)
+    (4, 4)
+    >>> a.rank(41), a.select(4), a.select(0, missing=True)
+    (5, 33, 1)
+    >>> a.str_stickers(3, 4)
+    '[29, 33, 41, 51]'
+    >>> a.str_repeat(1, 5)
+    '[54 (1), 60 (2)]'
+    >>> # Sem reaproveitamento de nós
+    >>> e, f = Collection(60, pool_limit=0), Collection(60, pool_limit=0)
+    >>> e.insert_many([3, 3, 12]); f.insert_many([0, 0])
+    >>> e.exchange(f)
+    >>> len(e.free), len(e.free_nos), e.str_stickers()
+    (0, 0, '[0, 3, 12]')
+    >>> # Inserção a partir de uma fila de outra coleção
+    >>> g = Collection(60)
+    >>> g.insert_many([3, 5, 5])
+    >>> g.str_repeat()
+    '[5 (1)]'
+    >>> fila = Fila(dono=g)
+    >>> fila.enfileira(g.duplicate_nodes[5])
+    >>> e.insert_queue(fila, 1)
+    >>> g.str_repeat(), g.total_units, list(g.iter_stickers())
+    ('[]', 2, [(3, 0), (5, 0)])
+    >>> e.str_stickers(), e.total_units
+    ('[0, 3, 5, 12]', 4)
+    >>> Collection(60).exchange(Collection(61))
+    Traceback (most recent call last):
+    ...
+    ValueError: Quantidade de cartas únicas diferentes
+    >>> # Sincronização por diferenças
+    >>> d = Collection(1000)
+    >>> d.apply_delta(d.diff(c))
+    >>> d.str_stickers(), d.str_repeat()
+    ('[7, 12, 500, 501, 502]', '[502 (2)]')
+    >>> c.remove(7)
+    >>> d.apply_delta(d.diff(c))
+    >>> d.str_stickers()
+    '[12, 500, 501, 502]'
     '''
     # campos: varia com a implementação
 
-    max_sticker : int
+    max_unique : int
+    # Total de figurinhas únicas
+    tot_stickers : int
+    # Total de unidades de figurinhas, contando as repetidas
+    tot_units : int
+    # Códigos das figurinhas repetidas, em ordem crescente
+    duplicate_index : list[int]
+    # Contagens por intervalo de códigos, criadas na primeira consulta
+    ranks : CodeRanks | None
+    # Nós das figurinhas repetidas, indexados pelo código
+    duplicate_nodes : dict[int, Sticker]
     sentinel : Sticker
+    # Quantidade de níveis da skip list em uso
+    level : int
+    # Nós removidos, reaproveitados por novas figurinhas
+    free : list[Sticker]
+    # Nós de Fila livres, reaproveitados nas trocas
+    free_nos : list[No]
+    # Limite de nós guardados em *free*
+    pool_limit : int
+    # Quantidade de nós de figurinha criados pela coleção
+    allocated : int
+    # Último nó visitado, de onde as buscas começam ("dedo")
+    finger : Sticker
+    # Máximo de passos da busca a partir do dedo antes de usar a skip list
+    finger_steps : int
+    # Figurinhas que a coleção possui
+    owned : Bitset
+    # Figurinhas que a coleção possui repetidas
+    duplicated : Bitset
+    # Número da versão da coleção, que muda a cada alteração
+    version : int
+    # Textos de str_stickers() e str_repeat() guardados entre as alterações
+    cache : RenderCache
 
-    def __init__(self, unique: int) -> None:
+    def __init__(self, unique: int, pool_limit: int = POOL_LIMIT,
+                 finger_steps: int = FINGER_STEPS,
+                 cache_limit: int | None = None) -> None:
         '''
         Cria uma coleção em relação a um álbum com *unique* figurinhas únicas,
         ou seja, os códigos das figurinhas variam de 0 a *unique*.
+
+        Até *pool_limit* nós de figurinhas removidas são guardados para
+        serem reaproveitados; 0 desativa o reaproveitamento.
+
+        As buscas começam pelo último nó visitado e andam até *finger_steps*
+        nós para frente ou para trás antes de recorrer à skip list; 0 faz
+        todas as buscas partirem do sentinela.
+
+        Os textos de str_stickers() e str_repeat() são guardados até a
+        próxima alteração da coleção, exceto os com mais de *cache_limit*
+        caracteres; None não impõe limite.
         '''
-        self.max_sticker = unique
-        self.sentinel = Sticker(None, None, None, None)
+        self.max_unique = unique
+        self.tot_stickers = 0
+        self.tot_units = 0
+        self.duplicate_index = []
+        self.ranks = None
+        self.duplicate_nodes = {}
+        self.sentinel = Sticker(None, None, None, None, MAX_LEVEL)
         self.sentinel.next = self.sentinel
         self.sentinel.previous = self.sentinel
+        self.sentinel.skips = [self.sentinel] * (MAX_LEVEL - 1)
+        self.level = 1
         self.start = None
         self.end = None
+        self.owned = Bitset(unique + 1)
+        self.duplicated = Bitset(unique + 1)
+        self.free = []
+        self.free_nos = []
+        self.pool_limit = pool_limit
+        self.allocated = 0
+        self.finger = self.sentinel
+        self.finger_steps = finger_steps
+        self.version = 0
+        self.cache = RenderCache(cache_limit)
+
+    @property
+    def max_sticker(self) -> int:
+        '''
+        Nome antigo de max_unique, mantido para quem já o usa.
+        '''
+        return self.max_unique
     
     def insert(self, code: int) -> None:
         '''
@@ -220,31 +412,19 @@ class Collection:
         Se a figurinha não estiver no intervalo das possíveis figurinhas
         do álbum, nada acontece.
         '''
-        on_collection = False
-        new = Sticker(self.sentinel, code, 1, self.sentinel)
-        if code > self.max_sticker or code < 0:
+        if code > self.max_unique or code < 0:
             return None
-        if self.sentinel.next is self.sentinel:
-            self.sentinel.insert_next(new)
+        previous = self.__locate(code)
+        i = previous.next
+        if i is not self.sentinel and i.id == code:
+            i.units += 1
+            self.__track_node(i, i.units - 1)
         else:
-            i = self.sentinel
-            while i.next is not self.sentinel and not on_collection:
-                i = i.next
-                if i.id == code:
-                    i.units += 1
-                    on_collection = True
-            if not on_collection:
-                i = self.sentinel
-                if i.next.id > code:
-                    i.insert_next(new)
-                    on_collection = True
-                while i.next is not self.sentinel and not on_collection:
-                    i = i.next
-                    if i.id < code and (i.next.id is None or i.next.id > code):
-                        i.insert_next(new)
-                        on_collection = True
-                if not on_collection:
-                    self.sentinel.insert_next(new)
+            i = self.__new_sticker(previous, code, i)
+            self.__link(i, self.__update_from(previous, len(i.skips) + 1))
+            self.__track_node(i, 0)
+        self.finger = i
+
     def remove(self, code: int) -> None:
         '''
         Reduz em 1 a quantidade da figurinha de código *code*.
@@ -252,67 +432,87 @@ class Collection:
         Se a quantidade da figurinha reduzir para 0, ela é removida
         da coleção. Se a figurinha não estiver na coleção, nada acontece.
         '''
-        removed = False
-        i = self.sentinel
-        while i.next is not self.sentinel and not removed:
-            i = i.next
-            if i.id == code and i.units == 1:
-                i.previous.next = i.next
-                i.next.previous = i.previous
-                removed = True
-            elif i.id == code and i.units >1:
-                i.units -= 1
-                removed = True
-
+        previous = self.__locate(code)
+        i = previous.next
+        self.finger = previous
+        if i is not self.sentinel and i.id == code:
+            i.units -= 1
+            self.__track_node(i, i.units + 1)
+            if i.units == 0:
+                self.__unlink(i, self.__update_from(previous, len(i.skips) + 1))
+                self.__release(i)
+            else:
+                self.finger = i
 
-    
     def have(self, code: int) -> bool:
         '''
         Retorna True se a figurinha de código *code* está na coleção.
         Retorna False em caso contrário.
         '''
-        i = self.sentinel
-        found = False
-        while i.next is not self.sentinel and not found:
-            i = i.next
-            if i.id == code:
-                found = True
-        return found
-
-    def str_stickers(self) -> str:
-        '''
-        Gera uma representação em formato de sting das figurinhas da coleção.
-        '''
-        
-        string = '['
-        i = self.sentinel.next
-        if i is not self.sentinel:
-            string = string + str(i.id)
-            while i.next is not self.sentinel:
-                i = i.next
-                string = string + ', ' + str(i.id)
-        string = string + ']'
-        return string
-    
-    def str_repeat(self) -> str:
+        self.finger = self.__locate(code)
+        i = self.finger.next
+        return i is not self.sentinel and i.id == code
+
+    def insert_many(self, codes: Iterable[int]) -> None:
         '''
-        Gera uma representação em formato de string das figurinhas repetidas
-        da coleção, junto com a quantidade (além da primeira) de cada figurinha
-        repetida.
+        Equivale a chamar insert() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os junta à coleção em uma só passada.
         '''
-        string = '['
-        i = self.sentinel
-        first = True
-        while i.next is not self.sentinel:
-            i = i.next
-            if i.units > 1 and not first:
-                string = string + ', ' + str(i.id) + ' (' + str(i.units - 1) + ')'
-            elif i.units > 1 and first:
-                string = string + str(i.id) + ' (' + str(i.units - 1) + ')'
-                first =False
-        string = string + ']'
-        return string
-    
+        self.__apply(count_codes(codes, self.max_unique))
+
+    def insert_counts(self, pairs: Iterable[tuple[int, int]]) -> None:
+        '''
+        Equivale a chamar insert() *count* vezes para cada par (code, count)
+        de *pairs*, sem expandir as quantidades, em uma só passada.
+        '''
+        self.__apply(merge_counts(pairs, self.max_unique))
+
+    def remove_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar remove() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os retira da coleção em uma só passada.
+        '''
+        self.__apply([(code, -count) for code, count in count_codes(codes, self.max_unique)])
+
+    def iter_stickers(self, offset: int = 0,
+                      limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Percorre as figurinhas da coleção em ordem crescente de código,
+        gerando os pares (código, quantidade além da primeira).
+
+        Com *offset* e *limit*, gera apenas até *limit* figurinhas a partir
+        da de posição *offset* (contando de 0).
+        '''
+        if offset == 0:
+            stk = self.sentinel.next
+        else:
+            code = self.__code_ranks().select(offset)
+            stk = self.sentinel if code is None else self.__locate(code).next
+        count = 0
+        while stk is not self.sentinel and (limit is None or count < limit):
+            yield stk.id, stk.units - 1
+            stk = stk.next
+            count += 1
+
+    def iter_repeats(self, offset: int = 0,
+                     limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Como iter_stickers(), mas gera apenas as figurinhas repetidas.
+        '''
+        end = None if limit is None else offset + limit
+        for code in self.duplicate_index[offset:end]:
+            yield code, self.duplicate_nodes[code].units - 1
+
+    def apply_delta(self, delta: bytes | memoryview) -> None:
+        '''
+        Aplica as variações de *delta*, gerado por diff(), em uma única
+        passada pelo encadeamento.
+        '''
+        max_unique, changes = decode_delta(delta)
+        if max_unique != self.max_unique:
+            raise ValueError('A diferença é de um álbum com outro número de figurinhas')
+        self.__apply(changes)
+
     def exchange(self, other: Collection):
         '''
         Realiza o máximo de trocas válidas possíveis entre a coleção e *other*.
@@ -325,74 +525,229 @@ class Collection:
 
         Requer que *other* seja uma coleção com o mesmo número de cartas únicas
         '''
-        self_repeats = Fila()
-        other_repeats = Fila()
+        if self.owned.size != other.owned.size:
+            raise ValueError('Quantidade de cartas únicas diferentes')
+        self_to_other, other_to_self = exchange_codes(self.owned, self.duplicated,
+                                                      other.owned, other.duplicated,
+                                                      self.duplicate_index,
+                                                      other.duplicate_index)
+        self_sent = [self.duplicate_nodes[code] for code in self_to_other]
+        other_sent = [other.duplicate_nodes[code] for code in other_to_self]
 
-        i = self.sentinel.next
-        j = other.sentinel.next
-        other_number = 0
-        self_number = 0
+        self_repeats = Fila(self.free_nos, self.pool_limit, self)
+        for stk in self_sent:
+            self_repeats.enfileira(stk)
+        other_repeats = Fila(other.free_nos, other.pool_limit, other)
+        for stk in other_sent:
+            other_repeats.enfileira(stk)
 
-        while i is not self.sentinel or j is not other.sentinel:
-            if i.id == j.id:
-                i = i.next
-                j = j.next
-            elif i.id is None and j.id is not None:
-                
-                if j.units > 1:
-                    other_repeats.enfileira(j)
-                    other_number += 1 
-                j = j.next
-            elif j.id is None and i.id is not None:
-                if i.units > 1:
-                    self_repeats.enfileira(i)
-                    self_number += 1
-                i = i.next
-            elif i.id < j.id:
-                if i.units > 1:
-                    self_repeats.enfileira(i)
-                    self_number += 1
-                if i is not self.sentinel:
-                    i = i.next
-                else:
-                    j = j.next
-            elif i.id > j.id:
-                if j.units > 1:
-                    other_repeats.enfileira(j)
-                    other_number += 1 
-                if j is not other.sentinel:
-                    j = j.next
-                else:
-                    i = i.next
-
-        if self_number > other_number:
-            trades = other_number
-        else:
-            trades = self_number
+        trades = len(self_to_other)
         self.insert_queue(other_repeats, trades)
         other.insert_queue(self_repeats, trades)
-        
+
     def insert_queue(self, fila : Fila, n : int) -> None:
         '''
         Insere na coleção adesivos não repetidos com base na Fila de adesivos,
         *n* vezes
+
+        Cada adesivo inserido tira uma unidade do Sticker de origem, e a
+        coleção dona da fila, se houver, é atualizada junto.
         '''
-        if n == 0:
-            return None
+        # Último nó visitado em cada nível, para ligar os níveis dos novos nós
+        last = [self.sentinel] * MAX_LEVEL
         i = self.sentinel
-        item = fila.desenfileira()
-        if i.next.id > item.id:
-            new = Sticker(i, item.id, 1, i.next)
-            i.insert_next(new)
+        while n > 0:
+            item = fila.desenfileira()
+            while i.next is not self.sentinel and i.next.id < item.id:
+                i = i.next
+                for level in range(len(i.skips) + 1):
+                    last[level] = i
+            new = self.__new_sticker(i, item.id, i.next)
+            self.__link(new, last)
+            self.__track_node(new, 0)
             item.units -= 1
+            if fila.dono is not None:
+                fila.dono.__track_node(item, item.units + 1)
             n -= 1
-            item = fila.desenfileira()
-        while i.next is not self.sentinel and n > 0:
-            i = i.next
-            new = Sticker(i, item.id, 1, i.next)
-            if i.id < item.id and (i.next is self.sentinel or i.next.id > item.id):
-                i.insert_next(new)
-                item.units -= 1
-                n -= 1
-                item = fila.desenfileira()
-    
\ No newline at end of file
+            i = new
+
+    def __load(self, codes: list[int], quants: list[int]) -> None:
+        '''
+        Preenche a coleção, que deve estar vazia, com as figurinhas de
+        *codes*, em ordem crescente, e as quantidades de *quants*.
+        '''
+        self.__apply(list(zip(codes, quants)))
+
+    def __apply(self, batch: list[tuple[int, int]]) -> None:
+        '''
+        Soma *delta* à quantidade de cada figurinha *code* dos pares
+        (code, delta) de *batch*, que devem estar em ordem crescente de código.
+        Figurinhas cuja quantidade chegar a 0 (ou menos) são removidas.
+
+        O encadeamento é percorrido uma única vez, guardando o último nó
+        visitado em cada nível para ligar e desligar os nós da skip list.
+        '''
+        last = [self.sentinel] * MAX_LEVEL
+        i = self.sentinel
+        for code, delta in batch:
+            while i.next is not self.sentinel and i.next.id < code:
+                i = i.next
+                for level in range(len(i.skips) + 1):
+                    last[level] = i
+            stk = i.next
+            if stk is not self.sentinel and stk.id == code:
+                old = stk.units
+                stk.units = max(old + delta, 0)
+                self.__track_node(stk, old)
+                if stk.units == 0:
+                    self.__unlink(stk, last)
+                    self.__release(stk)
+            elif delta > 0:
+                new = self.__new_sticker(i, code, stk)
+                new.units = delta
+                self.__link(new, last)
+                self.__track_node(new, 0)
+                i = new
+        # O dedo pode ter ficado em um nó removido
+        self.finger = self.sentinel
+
+    def __new_sticker(self, previous: Sticker, code: int, next: Sticker) -> Sticker:
+        '''
+        Devolve um nó para a figurinha *code* com uma unidade, entre *previous*
+        e *next*, reaproveitando um nó removido quando houver.
+
+        O nó reaproveitado mantém a sua altura na skip list, que foi sorteada
+        de forma independente do código.
+        '''
+        if self.free:
+            stk = self.free.pop()
+            stk.previous = previous
+            stk.id = code
+            stk.units = 1
+            stk.next = next
+        else:
+            stk = Sticker(previous, code, 1, next, random_height())
+            self.allocated += 1
+        return stk
+
+    def __release(self, stk: Sticker) -> None:
+        '''
+        Guarda o nó removido *stk* para ser reaproveitado, se houver espaço.
+        '''
+        if len(self.free) < self.pool_limit:
+            # Solta as referências para não manter outros nós vivos
+            stk.next = stk.previous = None #type: ignore
+            for level in range(len(stk.skips)):
+                stk.skips[level] = None #type: ignore
+            self.free.append(stk)
+
+    def __predecessors(self, code: int) -> list[Sticker]:
+        '''
+        Busca na skip list pela figurinha de código *code*.
+
+        Devolve uma lista com, para cada nível, o último nó cujo código é
+        menor que *code*. Nos níveis acima do mais alto em uso, é o sentinela.
+        '''
+        update = [self.sentinel] * MAX_LEVEL
+        i = self.sentinel
+        for level in range(self.level - 1, -1, -1):
+            nxt = i.forward(level)
+            while nxt is not self.sentinel and nxt.id < code:
+                i = nxt
+                nxt = i.forward(level)
+            update[level] = i
+        return update
+
+    def __locate(self, code: int) -> Sticker:
+        '''
+        Devolve o último nó do nível 0 cujo código é menor que *code* (ou o
+        sentinela, se não houver).
+
+        A busca anda a partir do dedo pelos ponteiros next ou previous, então
+        custa O(distância) quando *code* está perto do último nó visitado.
+        Se não chegar ao destino em *finger_steps* passos, usa a skip list.
+        '''
+        i = self.finger
+        steps = 0
+        if i is self.sentinel or i.id < code:
+            # Para frente: o sentinela funciona como o início da lista
+            while steps < self.finger_steps:
+                if i.next is self.sentinel or i.next.id >= code:
+                    return i
+                i = i.next
+                steps += 1
+        else:
+            while steps < self.finger_steps:
+                if i.previous is self.sentinel or i.previous.id < code:
+                    return i.previous
+                i = i.previous
+                steps += 1
+        return self.__predecessors(code)[0]
+
+    def __update_from(self, previous: Sticker, height: int) -> list[Sticker]:
+        '''
+        Devolve, para cada nível k abaixo de *height*, o último nó antes de
+        *previous*.next que aparece no nível k, como em __predecessors().
+
+        Os nós são encontrados andando para trás no nível 0 a partir de
+        *previous*, o que custa O(log n) em média.
+        '''
+        update = [previous]
+        i = previous
+        for level in range(1, height):
+            # O sentinela aparece em todos os níveis
+            while len(i.skips) < level:
+                i = i.previous
+            update.append(i)
+        return update
+
+    def __link(self, new: Sticker, update: list[Sticker]) -> None:
+        '''
+        Encadeia *new* logo após *update[k]* em cada nível k da sua altura
+        e o coloca em *update* nesses níveis.
+        '''
+        height = len(new.skips) + 1
+        update[0].insert_next(new)
+        for level in range(1, height):
+            new.set_forward(level, update[level].forward(level))
+            update[level].set_forward(level, new)
+        for level in range(height):
+            update[level] = new
+        self.level = max(self.level, height)
+
+    def __unlink(self, stk: Sticker, update: list[Sticker]) -> None:
+        '''
+        Retira *stk* do encadeamento em todos os níveis, onde *update* é o
+        resultado de __predecessors() para o seu código.
+        '''
+        stk.previous.next = stk.next
+        stk.next.previous = stk.previous
+        for level in range(1, len(stk.skips) + 1):
+            update[level].set_forward(level, stk.forward(level))
+        while self.level > 1 and self.sentinel.forward(self.level - 1) is self.sentinel:
+            self.level -= 1
+
+    def __track_node(self, stk: Sticker, old: int) -> None:
+        '''
+        Atualiza a coleção após a quantidade da figurinha *stk* passar de
+        *old* para a atual: além do que __track() atualiza, o total de
+        figurinhas únicas e os nós das repetidas.
+        '''
+        self.tot_stickers += (stk.units > 0) - (old > 0)
+        if (stk.units > 1) != (old > 1):
+            if stk.units > 1:
+                self.duplicate_nodes[stk.id] = stk
+            else:
+                del self.duplicate_nodes[stk.id]
+        self.__track(stk.id, old, stk.units)
+
+
+def random_height() -> int:
+    '''
+    Sorteia a altura de um novo nó da skip list: cada nível extra tem
+    metade da chance do anterior.
+    '''
+    height = 1
+    while height < MAX_LEVEL and random.random() < 0.5:
+        height += 1
+    return height
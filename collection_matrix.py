@@ -0,0 +1,481 @@
+'''
+Coleções de todos os colecionadores de um álbum em uma única matriz densa
+de quantidades, com operações em lote vetorizadas com NumPy.
+
+A linha *i* da matriz guarda a quantidade de cada código do álbum na
+coleção do colecionador *i*, no mesmo formato das linhas de
+population_store.PopulationStore, que pode ser usado sem cópias.
+
+Este módulo depende do NumPy, que as demais implementações não usam.
+'''
+from __future__ import annotations
+from snapshot import decode_delta, decode_snapshot, diff_pairs, encode_delta, encode_snapshot
+from tad_collection import render, repeat_texts, sticker_texts, write_chunks
+from typing import IO, Any, Iterable, Iterator
+import numpy as np
+
+# Linhas calculadas de cada vez em trade_potential()
+BLOCK_ROWS = 1024
+
+
+class CollectionMatrix:
+    '''
+    Coleções de *collectors* colecionadores de um álbum com códigos de 0 a
+    *max_unique*, em uma matriz collectors × (max_unique + 1) de inteiros de
+    32 bits sem sinal.
+
+    Se *counts* for dado, a matriz usa esse vetor, que deve ter esse formato,
+    em vez de criar uma matriz zerada.
+
+    Exemplos:
+    >>> m = CollectionMatrix(3, 60)
+    >>> m.insert_many([0, 0, 0, 0, 0, 0, 0], [3, 3, 12, 54, 54, 60, 60])
+    >>> m.insert_many([1, 1, 1, 1, 1], [0, 0, 12, 51, 51])
+    >>> m.insert_many([2, 2, 2], [3, 0, 7], [1, 2, 2])
+    >>> m[0].str_repeat(), m[2].str_stickers()
+    ('[3 (1), 54 (1), 60 (1)]', '[0, 3, 7]')
+    >>> m.trade_potential().tolist()
+    [[0, 2, 2], [2, 0, 1], [2, 1, 0]]
+    >>> m.best_partners(0, 2)
+    [(1, 2), (2, 2)]
+    >>> m[0].exchange(m[1])
+    >>> m[0].str_stickers(), m[1].str_repeat()
+    ('[0, 3, 12, 51, 54, 60]', '[]')
+    >>> m.remove_many([0, 0, 2], [60, 60, 7])
+    >>> m[0].str_repeat(), m[2].str_repeat()
+    ('[]', '[0 (1)]')
+    >>> # Matriz sobre um armazenamento em arquivo
+    >>> import os, tempfile
+    >>> from population_store import PopulationStore
+    >>> store = PopulationStore.create(os.path.join(tempfile.mkdtemp(), 'album.figp'), 60, 2)
+    >>> view = store[1]
+    >>> CollectionMatrix.from_store(store)
+    Traceback (most recent call last):
+    ...
+    ValueError: Há coleções do armazenamento em uso
+    >>> del view
+    >>> s = CollectionMatrix.from_store(store)
+    >>> s.insert_many([1, 1], [5, 5])
+    >>> del s
+    >>> store[1].str_repeat()
+    '[5 (1)]'
+    >>> store.close()
+    '''
+    # Máximo de figurinhas únicas do álbum
+    max_unique: int
+    # Quantidade de cada código, uma linha por colecionador
+    counts: Any
+
+    def __init__(self, collectors: int, max_unique: int, counts: Any = None) -> None:
+        self.max_unique = max_unique
+        if counts is None:
+            counts = np.zeros((collectors, max_unique + 1), dtype=np.uint32)
+        elif counts.shape != (collectors, max_unique + 1):
+            raise ValueError('O vetor de quantidades tem o formato errado')
+        self.counts = counts
+
+    @classmethod
+    def from_store(cls, store: Any) -> CollectionMatrix:
+        '''
+        Cria uma matriz sobre as linhas de *store*, um
+        population_store.PopulationStore, sem copiá-las. A matriz deve ser
+        descartada antes de store.resize() ou store.close().
+
+        A matriz precisa de acesso exclusivo às linhas: as coleções obtidas
+        com store[i] guardam totais e bitsets que não acompanhariam as
+        alterações da matriz. Por isso, nenhuma delas pode estar em uso.
+        '''
+        from population_store import HEADER
+        if len(store.views) > 0:
+            raise ValueError('Há coleções do armazenamento em uso')
+        counts = np.frombuffer(store.map, dtype=np.uint32,
+                               count=len(store) * (store.max_unique + 1),
+                               offset=HEADER.size)
+        return cls(len(store), store.max_unique,
+                   counts.reshape(len(store), store.max_unique + 1))
+
+    def __len__(self) -> int:
+        return self.counts.shape[0]
+
+    def __getitem__(self, collector: int) -> RowView:
+        '''
+        Coleção do colecionador *collector*, que lê e altera a própria linha
+        da matriz.
+        '''
+        if not 0 <= collector < len(self):
+            raise IndexError('Colecionador fora da matriz')
+        return RowView(self, collector)
+
+    def insert_many(self, collectors: Iterable[int], codes: Iterable[int],
+                    counts: Iterable[int] | None = None) -> None:
+        '''
+        Para cada posição *i*, aumenta em counts[i] (ou em 1, se *counts*
+        não for dado) a quantidade do código codes[i] na coleção de
+        collectors[i]. Códigos fora do álbum são descartados, como em
+        insert(). Pares repetidos são somados.
+        '''
+        rows = np.asarray(collectors, dtype=np.int64)
+        cols = np.asarray(codes, dtype=np.int64)
+        if rows.size and (rows.min() < 0 or rows.max() >= len(self)):
+            raise IndexError('Colecionador fora da matriz')
+        valid = (cols >= 0) & (cols <= self.max_unique)
+        if counts is None:
+            values: Any = 1
+        else:
+            amounts = np.asarray(counts, dtype=np.int64)
+            valid &= amounts > 0
+            values = amounts[valid].astype(np.uint32)
+        np.add.at(self.counts, (rows[valid], cols[valid]), values)
+
+    def remove_many(self, collectors: Iterable[int], codes: Iterable[int]) -> None:
+        '''
+        Para cada posição *i*, reduz em 1 a quantidade do código codes[i]
+        na coleção de collectors[i], sem deixá-la negativa.
+        '''
+        rows = np.asarray(collectors, dtype=np.int64)
+        cols = np.asarray(codes, dtype=np.int64)
+        if rows.size and (rows.min() < 0 or rows.max() >= len(self)):
+            raise IndexError('Colecionador fora da matriz')
+        valid = (cols >= 0) & (cols <= self.max_unique)
+        # Cada célula é reduzida uma vez, pelo número de pedidos para ela
+        cells, requests = np.unique(rows[valid] * (self.max_unique + 1) + cols[valid],
+                                    return_counts=True)
+        cell_rows, cell_cols = np.divmod(cells, self.max_unique + 1)
+        current = self.counts[cell_rows, cell_cols]
+        self.counts[cell_rows, cell_cols] = current - np.minimum(current, requests).astype(np.uint32)
+
+    def trade_potential(self, rows: Iterable[int] | None = None,
+                        block: int = BLOCK_ROWS) -> Any:
+        '''
+        Matriz em que a posição [i, j] é a quantidade de trocas que
+        exchange() faria entre o colecionador rows[i] (ou *i*, se *rows* não
+        for dado) e o colecionador *j*: o menor entre as repetidas de um que
+        faltam ao outro e as do outro que faltam ao primeiro.
+
+        As duas contagens saem de produtos das matrizes booleanas de
+        repetidas e de faltantes, calculados em blocos de *block* linhas
+        para limitar a memória intermediária.
+        '''
+        dup = (self.counts > 1).astype(np.float32)
+        missing = (self.counts == 0).astype(np.float32)
+        selected = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        result = np.empty((len(selected), len(self)), dtype=np.int32)
+        for start in range(0, len(selected), block):
+            part = selected[start:start + block]
+            # give[a, j]: repetidas de part[a] que faltam a j
+            give = dup[part] @ missing.T
+            # take[a, j]: repetidas de j que faltam a part[a]
+            take = missing[part] @ dup.T
+            result[start:start + len(part)] = np.minimum(give, take)
+        return result
+
+    def best_partners(self, collector: int, k: int) -> list[tuple[int, int]]:
+        '''
+        Os até *k* colecionadores com quem *collector* faria mais trocas,
+        como pares (colecionador, trocas), em ordem decrescente de trocas e
+        crescente de índice. Colecionadores sem trocas possíveis não
+        aparecem.
+        '''
+        scores = self.trade_potential([collector])[0]
+        partners = np.flatnonzero(scores > 0)
+        order = np.lexsort((partners, -scores[partners]))[:k]
+        return [(int(partners[i]), int(scores[partners[i]])) for i in order]
+
+
+class RowView:
+    '''
+    A coleção de um colecionador de uma CollectionMatrix, com a interface de
+    tad_collection.Collection. Todas as consultas são calculadas sobre a
+    linha da matriz, então refletem também as alterações em lote.
+    '''
+    # Matriz da coleção
+    matrix: CollectionMatrix
+    # Linha da coleção na matriz
+    collector: int
+
+    def __init__(self, matrix: CollectionMatrix, collector: int) -> None:
+        self.matrix = matrix
+        self.collector = collector
+
+    @property
+    def max_unique(self) -> int:
+        '''
+        Máximo de figurinhas únicas do álbum.
+        '''
+        return self.matrix.max_unique
+
+    @property
+    def row(self) -> Any:
+        '''
+        Linha da matriz com as quantidades da coleção.
+        '''
+        return self.matrix.counts[self.collector]
+
+    def insert(self, code: int) -> None:
+        '''
+        Aumenta em 1 a quantidade da figurinha de código *code*. Códigos
+        fora do álbum são ignorados.
+        '''
+        if 0 <= code <= self.max_unique:
+            self.row[code] += 1
+
+    def remove(self, code: int) -> None:
+        '''
+        Reduz em 1 a quantidade da figurinha de código *code*, se ela
+        estiver na coleção.
+        '''
+        if self.have(code):
+            self.row[code] -= 1
+
+    def have(self, code: int) -> bool:
+        '''
+        Retorna True se a figurinha de código *code* está na coleção.
+        '''
+        return 0 <= code <= self.max_unique and bool(self.row[code] > 0)
+
+    def insert_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar insert() para cada código de *codes*, com uma
+        única soma vetorizada.
+        '''
+        cols = np.asarray(list(codes), dtype=np.int64)
+        self.matrix.insert_many(np.full(len(cols), self.collector), cols)
+
+    def remove_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar remove() para cada código de *codes*.
+        '''
+        cols = np.asarray(list(codes), dtype=np.int64)
+        self.matrix.remove_many(np.full(len(cols), self.collector), cols)
+
+    def insert_counts(self, pairs: Iterable[tuple[int, int]]) -> None:
+        '''
+        Equivale a chamar insert() *count* vezes para cada par (code, count)
+        de *pairs*.
+        '''
+        data = np.asarray(list(pairs), dtype=np.int64).reshape(-1, 2)
+        self.matrix.insert_many(np.full(len(data), self.collector), data[:, 0], data[:, 1])
+
+    def iter_stickers(self, offset: int = 0,
+                      limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Percorre as figurinhas da coleção em ordem crescente de código,
+        gerando os pares (código, repetidas), a partir da posição *offset*
+        e com no máximo *limit* pares.
+        '''
+        row = self.row
+        codes = np.flatnonzero(row)
+        end = None if limit is None else offset + limit
+        for code in codes[offset:end].tolist():
+            yield code, int(row[code]) - 1
+
+    def iter_repeats(self, offset: int = 0,
+                     limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Como iter_stickers(), mas só com as figurinhas repetidas.
+        '''
+        row = self.row
+        codes = np.flatnonzero(row > 1)
+        end = None if limit is None else offset + limit
+        for code in codes[offset:end].tolist():
+            yield code, int(row[code]) - 1
+
+    def str_stickers(self, offset: int = 0, limit: int | None = None) -> str:
+        '''
+        Texto com os códigos das figurinhas da coleção, como em tad_collection.
+        '''
+        return render(sticker_texts(self.iter_stickers(offset, limit)))
+
+    def str_repeat(self, offset: int = 0, limit: int | None = None) -> str:
+        '''
+        Texto com as figurinhas repetidas e quantas são extras.
+        '''
+        return render(repeat_texts(self.iter_repeats(offset, limit)))
+
+    def write_stickers(self, fp: IO[str]) -> None:
+        '''
+        Escreve o texto de str_stickers() em *fp*, em pedaços.
+        '''
+        write_chunks(fp, sticker_texts(self.iter_stickers()))
+
+    def write_repeat(self, fp: IO[str]) -> None:
+        '''
+        Escreve o texto de str_repeat() em *fp*, em pedaços.
+        '''
+        write_chunks(fp, repeat_texts(self.iter_repeats()))
+
+    def __len__(self) -> int:
+        '''
+        Retorna a quantidade de figurinhas distintas da coleção.
+        '''
+        return int(np.count_nonzero(self.row))
+
+    @property
+    def distinct(self) -> int:
+        '''
+        Quantidade de figurinhas distintas.
+        '''
+        return len(self)
+
+    @property
+    def total_units(self) -> int:
+        '''
+        Quantidade de unidades, contando as repetidas.
+        '''
+        return int(self.row.sum(dtype=np.int64))
+
+    @property
+    def duplicate_codes(self) -> int:
+        '''
+        Quantidade de figurinhas com pelo menos uma repetida.
+        '''
+        return int(np.count_nonzero(self.row > 1))
+
+    @property
+    def spare_units(self) -> int:
+        '''
+        Quantidade de unidades além da primeira de cada figurinha.
+        '''
+        return self.total_units - len(self)
+
+    @property
+    def missing(self) -> int:
+        '''
+        Quantidade de figurinhas do álbum que faltam na coleção.
+        '''
+        return self.max_unique + 1 - len(self)
+
+    def count_owned(self, lo: int, hi: int) -> int:
+        '''
+        Quantidade de figurinhas distintas com códigos de *lo* a *hi*.
+        '''
+        return int(np.count_nonzero(self.row[max(lo, 0):max(hi + 1, 0)]))
+
+    def count_units(self, lo: int, hi: int) -> int:
+        '''
+        Quantidade de unidades com códigos de *lo* a *hi*.
+        '''
+        return int(self.row[max(lo, 0):max(hi + 1, 0)].sum(dtype=np.int64))
+
+    def rank(self, code: int) -> int:
+        '''
+        Quantidade de figurinhas possuídas com código menor que *code*.
+        '''
+        return int(np.count_nonzero(self.row[:max(code, 0)]))
+
+    def select(self, k: int, missing: bool = False) -> int | None:
+        '''
+        Código da figurinha possuída (ou faltante) de posição *k*, ou None.
+        '''
+        codes = np.flatnonzero(self.row == 0 if missing else self.row)
+        return int(codes[k]) if 0 <= k < len(codes) else None
+
+    def iter_missing(self) -> Iterator[int]:
+        '''
+        Percorre, em ordem crescente, os códigos que faltam na coleção.
+        '''
+        return iter(np.flatnonzero(self.row == 0).tolist())
+
+    def next_missing(self, code: int) -> int | None:
+        '''
+        Menor código maior que *code* que falta na coleção, ou None.
+        '''
+        start = max(code + 1, 0)
+        codes = np.flatnonzero(self.row[start:] == 0)
+        return start + int(codes[0]) if len(codes) else None
+
+    def prev_owned(self, code: int) -> int | None:
+        '''
+        Maior código menor que *code* que está na coleção, ou None.
+        '''
+        codes = np.flatnonzero(self.row[:max(code, 0)])
+        return int(codes[-1]) if len(codes) else None
+
+    def missing_in_range(self, lo: int, hi: int) -> list[int]:
+        '''
+        Códigos de *lo* a *hi* que faltam na coleção.
+        '''
+        lo = max(lo, 0)
+        return (np.flatnonzero(self.row[lo:max(hi + 1, lo)] == 0) + lo).tolist()
+
+    def to_bytes(self) -> bytes:
+        '''
+        Codifica a coleção no formato binário de snapshot.py.
+        '''
+        return encode_snapshot(self.max_unique, self.iter_stickers())
+
+    @classmethod
+    def from_bytes(cls, data: bytes | memoryview, **options: Any) -> RowView:
+        '''
+        Cria, a partir dos bytes gerados por to_bytes(), a coleção de uma
+        matriz nova com um único colecionador.
+        '''
+        max_unique, codes, quants = decode_snapshot(data)
+        view = CollectionMatrix(1, max_unique, **options)[0]
+        view.row[codes] = quants
+        return view
+
+    def save(self, path: str) -> None:
+        '''
+        Grava a coleção no arquivo *path*, no formato de to_bytes().
+        '''
+        with open(path, 'wb') as fp:
+            fp.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str, **options: Any) -> RowView:
+        '''
+        Lê a coleção gravada com save() no arquivo *path*.
+        '''
+        with open(path, 'rb') as fp:
+            return cls.from_bytes(memoryview(fp.read()), **options)
+
+    def diff(self, other: Any) -> bytes:
+        '''
+        Codifica as variações de quantidade que levam a coleção a *other*.
+        '''
+        return encode_delta(self.max_unique, diff_pairs(self.iter_stickers(), other.iter_stickers()))
+
+    def apply_delta(self, delta: bytes | memoryview) -> None:
+        '''
+        Aplica as variações de *delta*, gerado por diff(), em uma única
+        operação sobre a linha.
+        '''
+        max_unique, changes = decode_delta(delta)
+        if max_unique != self.max_unique:
+            raise ValueError('A diferença é de um álbum com outro número de figurinhas')
+        if changes:
+            data = np.asarray(changes, dtype=np.int64)
+            codes = data[:, 0]
+            row = self.row
+            row[codes] = np.maximum(row[codes].astype(np.int64) + data[:, 1], 0)
+
+    def exchange(self, other: Any) -> None:
+        '''
+        Realiza o máximo de trocas válidas possíveis entre a coleção e
+        *other*, com prioridade para os menores códigos, como em
+        tad_collection.Collection.exchange().
+        '''
+        size = other.row.size if isinstance(other, RowView) else other.owned.size
+        if size != self.max_unique + 1:
+            raise ValueError('Quantidade de cartas únicas diferentes')
+        mine = self.row
+        if isinstance(other, RowView):
+            theirs = other.row
+        else:
+            theirs = np.zeros(self.max_unique + 1, dtype=np.uint32)
+            for code, extra in other.iter_stickers():
+                theirs[code] = extra + 1
+        give = np.flatnonzero((mine > 1) & (theirs == 0))
+        take = np.flatnonzero((theirs > 1) & (mine == 0))
+        trades = min(len(give), len(take))
+        give, take = give[:trades], take[:trades]
+        mine[give] -= 1
+        mine[take] += 1
+        if isinstance(other, RowView):
+            theirs[give] += 1
+            theirs[take] -= 1
+        else:
+            for sent, received in zip(give.tolist(), take.tolist()):
+                other.insert(sent)
+                other.remove(received)
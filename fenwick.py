@@ -0,0 +1,167 @@
+from __future__ import annotations
+from array import array
+from typing import Iterable
+
+
+class Fenwick:
+    '''
+    Uma árvore de Fenwick (Binary Indexed Tree) sobre as posições de 0 a
+    *size* - 1. Soma um valor a uma posição e calcula a soma de um prefixo
+    em O(log n).
+
+    Exemplos:
+    >>> t = Fenwick(10, [0, 1, 0, 2, 0, 0, 1, 0, 0, 1])
+    >>> t.prefix(4) # posições 0 a 3
+    3
+    >>> t.add(5, 4)
+    >>> t.range_sum(4, 6)
+    5
+    >>> t.select(3) # primeira posição em que a soma acumulada passa de 3
+    5
+    >>> t.select(10) is None
+    True
+    '''
+    # Quantidade de posições
+    size: int
+    # tree[i] guarda a soma das posições i - (i & -i) até i - 1
+    tree: array
+
+    def __init__(self, size: int, values: Iterable[int] = ()) -> None:
+        '''
+        Cria uma árvore com *size* posições. Os valores iniciais das
+        primeiras posições podem ser dados em *values*; a construção é O(n).
+        '''
+        self.size = size
+        self.tree = array('q', [0]) * (size + 1)
+        for i, value in enumerate(values, 1):
+            self.tree[i] += value
+            parent = i + (i & -i)
+            if parent <= size:
+                self.tree[parent] += self.tree[i]
+
+    def add(self, i: int, delta: int) -> None:
+        '''
+        Soma *delta* ao valor da posição *i*.
+        '''
+        i += 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, i: int) -> int:
+        '''
+        Soma dos valores das posições 0 a *i* - 1.
+        '''
+        i = min(i, self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, lo: int, hi: int) -> int:
+        '''
+        Soma dos valores das posições *lo* a *hi*, inclusive. Posições fora
+        da árvore são ignoradas.
+        '''
+        lo = max(lo, 0)
+        if hi < lo:
+            return 0
+        return self.prefix(hi + 1) - self.prefix(lo)
+
+    def select(self, k: int, complement: bool = False) -> int | None:
+        '''
+        Devolve a menor posição em que a soma acumulada passa de *k*, ou None
+        se a soma de todas as posições não passar de *k*. Com valores 0 e 1,
+        é a posição do (*k* + 1)-ésimo 1.
+
+        Se *complement* for True, os valores (que devem ser 0 ou 1) são
+        trocados por 1 - valor, o que localiza o (*k* + 1)-ésimo 0.
+        '''
+        if k < 0:
+            return None
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step > 0:
+            nxt = pos + step
+            if nxt <= self.size:
+                # tree[nxt] cobre exatamente as *step* posições seguintes a pos
+                value = self.tree[nxt]
+                if complement:
+                    value = step - value
+                if value <= k:
+                    pos = nxt
+                    k -= value
+            step >>= 1
+        if pos >= self.size:
+            return None
+        return pos
+
+
+class CodeRanks:
+    '''
+    Contagens por intervalo de códigos de uma coleção: quantas figurinhas
+    distintas e quantas unidades ela tem entre dois códigos, a posição de
+    um código entre as possuídas e o código da k-ésima possuída ou faltante.
+
+    Exemplos:
+    >>> r = CodeRanks(10, [(2, 1), (5, 3), (7, 1)])
+    >>> r.count_owned(0, 5), r.count_units(0, 5)
+    (2, 4)
+    >>> r.update(5, 3, 0)
+    >>> r.count_owned(0, 5), r.count_units(0, 9)
+    (1, 2)
+    >>> r.rank(7)
+    1
+    >>> r.select(1), r.select(0, missing=True), r.select(2, missing=True)
+    (7, 0, 3)
+    '''
+    # 1 em cada código possuído
+    owned: Fenwick
+    # Quantidade de cada código
+    units: Fenwick
+
+    def __init__(self, size: int, pairs: Iterable[tuple[int, int]] = ()) -> None:
+        '''
+        Cria as contagens para os códigos de 0 a *size* - 1, a partir dos
+        pares (código, quantidade) de *pairs*.
+        '''
+        quants = [0] * size
+        for code, quant in pairs:
+            quants[code] = quant
+        self.owned = Fenwick(size, [quant > 0 for quant in quants])
+        self.units = Fenwick(size, quants)
+
+    def update(self, code: int, old: int, quant: int) -> None:
+        '''
+        Registra que a quantidade de *code* passou de *old* para *quant*.
+        '''
+        if (quant > 0) != (old > 0):
+            self.owned.add(code, 1 if quant > 0 else -1)
+        self.units.add(code, quant - old)
+
+    def count_owned(self, lo: int, hi: int) -> int:
+        '''
+        Quantidade de figurinhas distintas com códigos de *lo* a *hi*.
+        '''
+        return self.owned.range_sum(lo, hi)
+
+    def count_units(self, lo: int, hi: int) -> int:
+        '''
+        Quantidade de unidades, contando as repetidas, com códigos de *lo*
+        a *hi*.
+        '''
+        return self.units.range_sum(lo, hi)
+
+    def rank(self, code: int) -> int:
+        '''
+        Quantidade de figurinhas possuídas com código menor que *code*.
+        '''
+        return self.owned.prefix(max(code, 0))
+
+    def select(self, k: int, missing: bool = False) -> int | None:
+        '''
+        Código da figurinha possuída (ou faltante, se *missing* for True) de
+        posição *k*, contando a partir de 0. None se ela não existir.
+        '''
+        return self.owned.select(k, complement=missing)
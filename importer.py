@@ -0,0 +1,175 @@
+'''
+Importação em lote de inventários a partir de arquivos de texto/CSV.
+
+Cada linha do arquivo tem o formato
+
+    collector_id,code[,count]
+
+em que *count*, se omitido, vale 1. Linhas em branco são ignoradas, e uma
+primeira linha que não comece por um número é tratada como cabeçalho.
+
+Linhas mal formadas, com colecionador inexistente, código fora do álbum
+ou quantidade menor que 1 são descartadas e contadas no resumo.
+
+O arquivo é lido em blocos de tamanho fixo, e as linhas de cada bloco são
+agrupadas por colecionador e entregues de uma vez a insert_counts(). Assim
+a memória usada depende do tamanho do bloco, e não do tamanho do arquivo.
+
+Uso:
+    python importer.py arquivo.csv max_unique [tamanho_do_bloco]
+'''
+from __future__ import annotations
+from collections import defaultdict
+from collection_array import Collection as ArrayCollection
+from dataclasses import dataclass
+from typing import IO, Any, Callable
+import sys
+import time
+
+# Caracteres lidos do arquivo a cada bloco
+CHUNK_SIZE = 1 << 20
+
+
+@dataclass
+class ImportStats:
+    '''
+    Resumo de uma importação.
+    '''
+    # Linhas com dados lidas, incluindo as descartadas
+    rows: int = 0
+    # Linhas descartadas por estarem mal formadas
+    skipped: int = 0
+    # Colecionadores que receberam figurinhas
+    collectors: int = 0
+    # Tempo decorrido, em segundos
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        '''
+        Vazão da importação, em linhas por segundo.
+        '''
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def import_inventories(source: str | IO[str], collections: Any,
+                       chunk_size: int = CHUNK_SIZE,
+                       progress: Callable[[ImportStats], None] | None = None) -> ImportStats:
+    '''
+    Importa as linhas de *source*, um caminho ou um arquivo de texto aberto,
+    para *collections*, em que collections[collector_id] deve devolver a
+    coleção do colecionador: por exemplo, um dicionário com as coleções, um
+    collections.defaultdict ou um population_store.PopulationStore.
+
+    O arquivo é lido em blocos de *chunk_size* caracteres. Todas as linhas
+    de um bloco são validadas antes de qualquer uma ser aplicada: um
+    colecionador que *collections* não conhece (IndexError ou KeyError),
+    um código fora do álbum da coleção ou uma quantidade menor que 1 fazem
+    a linha ser descartada. Ao fim de cada bloco, *progress*, se dado,
+    recebe o resumo parcial da importação.
+
+    Exemplos:
+    >>> import io
+    >>> data = io.StringIO("collector_id,code,count\\n1,5\\n2,7,3\\n1,5,2\\n1,abc\\n\\n2,9\\n")
+    >>> found = defaultdict(lambda: ArrayCollection(60))
+    >>> stats = import_inventories(data, found, chunk_size=8)
+    >>> stats.rows, stats.skipped, stats.collectors
+    (5, 1, 2)
+    >>> found[1].str_repeat(), found[2].str_stickers(), found[2].str_repeat()
+    ('[5 (2)]', '[7, 9]', '[7 (2)]')
+    >>> known = {0: ArrayCollection(60), 1: ArrayCollection(60)}
+    >>> data = io.StringIO("0,5,-3\\n0,6,0\\n0,99\\n5,3\\n-1,3\\n1,4,2\\n")
+    >>> stats = import_inventories(data, known)
+    >>> stats.rows, stats.skipped, stats.collectors
+    (6, 5, 1)
+    >>> known[0].str_stickers(), known[1].str_repeat(), sorted(known)
+    ('[]', '[4 (1)]', [0, 1])
+    '''
+    if isinstance(source, str):
+        with open(source, encoding='utf-8', newline='') as fp:
+            return import_inventories(fp, collections, chunk_size, progress)
+
+    stats = ImportStats()
+    seen: set[int] = set()
+    start = time.perf_counter()
+    first = True
+    rest = ''
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            lines = [rest] if rest else []
+        else:
+            lines = (rest + chunk).split('\n')
+            # A última linha do bloco pode continuar no próximo
+            rest = lines.pop()
+        groups: dict[int, list[tuple[int, int]]] = {}
+        # Coleção de cada colecionador do bloco, consultada uma vez por bloco
+        targets: dict[int, Any] = {}
+        for line in lines:
+            fields = line.split(',')
+            if first:
+                first = False
+                if not fields[0].strip().isdigit():
+                    continue
+            if not line.strip():
+                continue
+            stats.rows += 1
+            try:
+                collector = int(fields[0])
+                code = int(fields[1])
+                count = int(fields[2]) if len(fields) > 2 else 1
+            except (IndexError, ValueError):
+                stats.skipped += 1
+                continue
+            if len(fields) > 3 or collector < 0 or count < 1:
+                stats.skipped += 1
+                continue
+            target = targets.get(collector)
+            if target is None:
+                try:
+                    target = collections[collector]
+                except (IndexError, KeyError):
+                    stats.skipped += 1
+                    continue
+                targets[collector] = target
+            if not 0 <= code < target.owned.size:
+                stats.skipped += 1
+                continue
+            group = groups.get(collector)
+            if group is None:
+                group = groups[collector] = []
+            group.append((code, count))
+        for collector, pairs in groups.items():
+            targets[collector].insert_counts(pairs)
+            seen.add(collector)
+        stats.collectors = len(seen)
+        stats.seconds = time.perf_counter() - start
+        if progress is not None:
+            progress(stats)
+        if not chunk:
+            return stats
+
+
+def main(argv: list[str]) -> None:
+    '''
+    Importa o arquivo dado na linha de comando para coleções de
+    collection_array e mostra a vazão a cada bloco e no fim.
+    '''
+    if len(argv) < 2:
+        print(__doc__)
+        return
+    max_unique = int(argv[1])
+    chunk_size = int(argv[2]) if len(argv) > 2 else CHUNK_SIZE
+    found: defaultdict[int, ArrayCollection] = defaultdict(lambda: ArrayCollection(max_unique))
+
+    def progress(stats: ImportStats) -> None:
+        print(f'{stats.rows:>12} linhas {stats.rows_per_second:>12.0f} linhas/s', file=sys.stderr)
+
+    stats = import_inventories(argv[0], found, chunk_size, progress)
+    print(f'{stats.rows} linhas ({stats.skipped} descartadas), '
+          f'{stats.collectors} colecionadores, {stats.seconds:.2f} s, '
+          f'{stats.rows_per_second:.0f} linhas/s')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,385 @@
+'''
+Log de operações (write-ahead log) para coleções identificadas por chaves
+inteiras.
+
+Cada insert, remove ou exchange é gravado no log antes de ser aplicado.
+As gravações são agrupadas (group commit): o log só é sincronizado com o
+disco quando o grupo atinge *max_batch* operações ou quando a operação mais
+antiga do grupo espera *max_latency* segundos.
+
+Arquivos no diretório do log:
+
+- SNAPSHOT_FILE: as coleções no último ponto de controle, cada uma no
+  formato de to_bytes(), junto com a época do ponto de controle;
+- LOG_FILE: a época do ponto de controle e, depois dela, os grupos de
+  operações, cada um com tamanho e CRC32, para que um grupo gravado pela
+  metade seja descartado na recuperação.
+
+Ao abrir, as coleções são lidas do snapshot e as operações do log são
+reaplicadas. A cada *compact_every* operações, um novo ponto de controle
+grava o snapshot e começa um log vazio, o que limita o tempo de recuperação.
+'''
+from __future__ import annotations
+from collection_array import Collection as ArrayCollection
+from snapshot import read_varint, write_varint
+from typing import Any
+import os
+import struct
+import threading
+import zlib
+
+# Arquivo com as coleções do último ponto de controle
+SNAPSHOT_FILE = 'collections.snapshot'
+# Arquivo com as operações feitas depois do ponto de controle
+LOG_FILE = 'operations.log'
+# Identificação dos arquivos
+SNAPSHOT_MAGIC = b'FIGW'
+LOG_MAGIC = b'FIGL'
+# Versão atual dos formatos
+VERSION = 1
+# Códigos das operações
+INSERT = 1
+REMOVE = 2
+EXCHANGE = 3
+# Padrões de agrupamento e compactação
+MAX_LATENCY = 0.01
+MAX_BATCH = 256
+COMPACT_EVERY = 100_000
+# CRC32 de cada grupo de operações
+CRC = struct.Struct('<I')
+
+
+class OperationLog:
+    '''
+    Coleções de um álbum com códigos de 0 a *max_unique*, identificadas por
+    chaves inteiras não negativas, com as alterações gravadas no diretório
+    *directory*.
+
+    *backend* é a classe das coleções; ela deve oferecer a interface de
+    tad_collection.Collection, incluindo to_bytes() e from_bytes().
+
+    Exemplos:
+    >>> import tempfile
+    >>> directory = tempfile.mkdtemp()
+    >>> with OperationLog(directory, 60) as log:
+    ...     for code in [3, 3, 12, 54, 54]:
+    ...         log.insert(1, code)
+    ...     for code in [0, 0, 12]:
+    ...         log.insert(7, code)
+    ...     log.exchange(1, 7)
+    >>> log = OperationLog(directory, 60)
+    >>> log.collection(1).str_stickers(), log.collection(7).str_stickers()
+    ('[0, 3, 12, 54]', '[0, 3, 12]')
+    >>> log.remove(7, 0)
+    >>> log.checkpoint()
+    >>> log.insert(7, 60)
+    >>> log.commit()
+    >>> log.file.close() # simula uma queda, sem close()
+    >>> log = OperationLog(directory, 60)
+    >>> log.collection(7).str_stickers()
+    '[3, 12, 60]'
+    >>> log.insert(-1, 5)
+    Traceback (most recent call last):
+    ...
+    ValueError: As chaves devem ser inteiros não negativos
+    >>> log.insert(2, 9)
+    >>> log.close()
+    >>> OperationLog(directory, 60).collection(2).str_stickers()
+    '[9]'
+    '''
+    # Diretório dos arquivos
+    directory: str
+    # Máximo de figurinhas únicas do álbum
+    max_unique: int
+    # Classe das coleções
+    backend: Any
+    # Coleções, por chave
+    collections: dict[int, Any]
+    # Tempo máximo, em segundos, que uma operação espera para ser sincronizada
+    max_latency: float
+    # Quantidade de operações que força a sincronização do grupo
+    max_batch: int
+    # Quantidade de operações no log que dispara um ponto de controle
+    compact_every: int
+    # Número do último ponto de controle
+    epoch: int
+    # Operações gravadas no log desde o último ponto de controle
+    logged: int
+    # Log aberto para acrescentar
+    file: Any
+    # Operações ainda não sincronizadas, já codificadas
+    pending: bytearray
+    # Quantidade de operações em *pending*
+    pending_count: int
+    # Sincronização agendada para o grupo atual
+    timer: threading.Timer | None
+    # Protege *pending* e o arquivo do log
+    lock: threading.Lock
+
+    def __init__(self, directory: str, max_unique: int, backend: Any = ArrayCollection,
+                 max_latency: float = MAX_LATENCY, max_batch: int = MAX_BATCH,
+                 compact_every: int = COMPACT_EVERY) -> None:
+        '''
+        Abre o log do diretório *directory*, criando-o se preciso, e
+        recupera as coleções a partir do snapshot e das operações gravadas.
+        '''
+        if max_batch < 1:
+            raise ValueError('O grupo deve ter pelo menos 1 operação')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_unique = max_unique
+        self.backend = backend
+        self.max_latency = max_latency
+        self.max_batch = max_batch
+        self.compact_every = compact_every
+        self.collections = {}
+        self.epoch = 0
+        self.logged = 0
+        self.pending = bytearray()
+        self.pending_count = 0
+        self.timer = None
+        self.lock = threading.Lock()
+        self.__load_snapshot()
+        end = self.__replay()
+        if end is None:
+            self.__new_log()
+        else:
+            # Descarta um grupo gravado pela metade no fim do log
+            self.file = open(self.__path(LOG_FILE), 'r+b')
+            self.file.truncate(end)
+            self.file.seek(end)
+
+    def collection(self, key: int) -> Any:
+        '''
+        Coleção da chave *key*. Chaves sem operações têm coleções vazias.
+        '''
+        collection = self.collections.get(key)
+        if collection is None:
+            collection = self.backend(self.max_unique)
+            self.collections[key] = collection
+        return collection
+
+    def insert(self, key: int, code: int) -> None:
+        '''
+        Registra e aplica collection(*key*).insert(*code*).
+        '''
+        if 0 <= code <= self.max_unique:
+            self.__record(INSERT, key, code)
+
+    def remove(self, key: int, code: int) -> None:
+        '''
+        Registra e aplica collection(*key*).remove(*code*).
+        '''
+        if 0 <= code <= self.max_unique:
+            self.__record(REMOVE, key, code)
+
+    def exchange(self, key: int, other: int) -> None:
+        '''
+        Registra e aplica collection(*key*).exchange(collection(*other*)).
+        '''
+        self.__record(EXCHANGE, key, other)
+
+    def commit(self) -> None:
+        '''
+        Grava e sincroniza com o disco as operações pendentes. Quando
+        retorna, todas as operações feitas até aqui sobrevivem a uma queda.
+        '''
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.pending_count == 0:
+                return
+            frame = bytearray()
+            write_varint(frame, len(self.pending))
+            frame += CRC.pack(zlib.crc32(self.pending))
+            frame += self.pending
+            self.file.write(frame)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = bytearray()
+            self.pending_count = 0
+
+    def checkpoint(self) -> None:
+        '''
+        Grava um snapshot de todas as coleções e começa um log vazio.
+
+        O snapshot é escrito em um arquivo temporário e colocado no lugar do
+        anterior de uma só vez. O log antigo só é trocado depois, e a época
+        gravada nos dois arquivos faz a recuperação ignorar um log antigo
+        que tenha sobrado de uma queda no meio do ponto de controle.
+        '''
+        self.commit()
+        self.epoch += 1
+        data = bytearray(SNAPSHOT_MAGIC)
+        data.append(VERSION)
+        write_varint(data, self.epoch)
+        write_varint(data, len(self.collections))
+        for key, collection in self.collections.items():
+            encoded = collection.to_bytes()
+            write_varint(data, key)
+            write_varint(data, len(encoded))
+            data += encoded
+        self.__replace(SNAPSHOT_FILE, data)
+        self.file.close()
+        self.__new_log()
+        self.logged = 0
+
+    def close(self) -> None:
+        '''
+        Sincroniza as operações pendentes e fecha o log.
+        '''
+        self.commit()
+        self.file.close()
+
+    def __enter__(self) -> OperationLog:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    # MÉTODOS AUXILIARES
+
+    def __record(self, op: int, key: int, value: int) -> None:
+        '''
+        Grava a operação no log e a aplica. O ponto de controle, quando
+        devido, só é feito depois, para que o snapshot já inclua a operação.
+        '''
+        for number in (key, value):
+            if not isinstance(number, int) or number < 0:
+                raise ValueError('As chaves devem ser inteiros não negativos')
+        self.__log(op, key, value)
+        self.__apply(op, key, value)
+        self.logged += 1
+        if self.logged >= self.compact_every:
+            self.checkpoint()
+
+    def __log(self, op: int, key: int, value: int) -> None:
+        '''
+        Acrescenta a operação ao grupo pendente e sincroniza o grupo se ele
+        estiver cheio. A primeira operação de um grupo agenda a sincronização
+        para daqui a *max_latency* segundos.
+
+        A operação é codificada à parte e só então acrescentada ao grupo,
+        para que um erro na codificação não deixe um registro incompleto.
+        '''
+        record = bytearray([op])
+        write_varint(record, key)
+        write_varint(record, value)
+        with self.lock:
+            self.pending += record
+            self.pending_count += 1
+            full = self.pending_count >= self.max_batch
+            if not full and self.timer is None:
+                self.timer = threading.Timer(self.max_latency, self.commit)
+                self.timer.daemon = True
+                self.timer.start()
+        if full:
+            self.commit()
+
+    def __apply(self, op: int, key: int, value: int) -> None:
+        '''
+        Aplica uma operação às coleções, sem gravá-la no log.
+        '''
+        if op == INSERT:
+            self.collection(key).insert(value)
+        elif op == REMOVE:
+            self.collection(key).remove(value)
+        elif op == EXCHANGE:
+            self.collection(key).exchange(self.collection(value))
+        else:
+            raise ValueError('Operação desconhecida no log')
+
+    def __load_snapshot(self) -> None:
+        '''
+        Lê as coleções e a época do último ponto de controle, se houver.
+        '''
+        try:
+            with open(self.__path(SNAPSHOT_FILE), 'rb') as fp:
+                view = memoryview(fp.read())
+        except FileNotFoundError:
+            return
+        if bytes(view[:len(SNAPSHOT_MAGIC)]) != SNAPSHOT_MAGIC or view[len(SNAPSHOT_MAGIC)] != VERSION:
+            raise ValueError('Snapshot de coleções inválido')
+        self.epoch, pos = read_varint(view, len(SNAPSHOT_MAGIC) + 1)
+        count, pos = read_varint(view, pos)
+        for _ in range(count):
+            key, pos = read_varint(view, pos)
+            size, pos = read_varint(view, pos)
+            self.collections[key] = self.backend.from_bytes(view[pos:pos + size])
+            pos += size
+
+    def __replay(self) -> int | None:
+        '''
+        Reaplica os grupos de operações do log da época atual. Devolve a
+        posição do fim do último grupo completo, ou None se não houver log
+        da época atual.
+        '''
+        try:
+            with open(self.__path(LOG_FILE), 'rb') as fp:
+                view = memoryview(fp.read())
+        except FileNotFoundError:
+            return None
+        header = len(LOG_MAGIC) + 1
+        if bytes(view[:len(LOG_MAGIC)]) != LOG_MAGIC or len(view) <= header or view[len(LOG_MAGIC)] != VERSION:
+            return None
+        try:
+            epoch, pos = read_varint(view, header)
+        except ValueError:
+            return None
+        if epoch != self.epoch:
+            # Log anterior ao último ponto de controle
+            return None
+        end = pos
+        while pos < len(view):
+            try:
+                size, pos = read_varint(view, pos)
+            except ValueError:
+                break
+            if pos + CRC.size + size > len(view):
+                break
+            (crc,) = CRC.unpack(view[pos:pos + CRC.size])
+            payload = view[pos + CRC.size:pos + CRC.size + size]
+            if zlib.crc32(payload) != crc:
+                break
+            i = 0
+            while i < size:
+                op = payload[i]
+                key, i = read_varint(payload, i + 1)
+                value, i = read_varint(payload, i)
+                self.__apply(op, key, value)
+                self.logged += 1
+            pos += CRC.size + size
+            end = pos
+        return end
+
+    def __new_log(self) -> None:
+        '''
+        Começa um log vazio para a época atual e o abre para acrescentar.
+        '''
+        header = bytearray(LOG_MAGIC)
+        header.append(VERSION)
+        write_varint(header, self.epoch)
+        self.__replace(LOG_FILE, header)
+        self.file = open(self.__path(LOG_FILE), 'ab')
+
+    def __replace(self, name: str, data: bytes | bytearray) -> None:
+        '''
+        Troca o conteúdo do arquivo *name* por *data* de uma só vez,
+        escrevendo antes em um arquivo temporário sincronizado com o disco.
+        '''
+        temp = self.__path(name + '.tmp')
+        with open(temp, 'wb') as fp:
+            fp.write(data)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(temp, self.__path(name))
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
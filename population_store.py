@@ -0,0 +1,173 @@
+'''
+Armazenamento em arquivo das coleções de muitos colecionadores de um
+mesmo álbum.
+
+O arquivo tem um cabeçalho seguido de uma linha de tamanho fixo por
+colecionador, com a quantidade de cada código do álbum em um inteiro de 32
+bits sem sinal, na ordem de bytes da máquina. O arquivo é mapeado na
+memória com mmap, então abrir o armazenamento não lê as linhas: o sistema
+operacional só carrega as páginas das coleções que forem usadas.
+'''
+from __future__ import annotations
+from collection_contagem import Collection
+from typing import Any
+from weakref import WeakValueDictionary
+import mmap
+import struct
+
+# Identificação do formato
+MAGIC = b'FIGP'
+# Versão atual do formato
+VERSION = 1
+# Cabeçalho: MAGIC, versão, max_unique e quantidade de colecionadores
+HEADER = struct.Struct('<4sIQQ')
+# Bytes de cada quantidade
+COUNT_BYTES = 4
+
+
+class PopulationStore:
+    '''
+    Coleções de *collectors* colecionadores de um álbum com códigos de 0 a
+    *max_unique*, guardadas em um arquivo mapeado na memória.
+
+    Cada colecionador é acessado como uma collection_contagem.Collection
+    cujo vetor de quantidades é a própria linha do arquivo, então insert,
+    remove, exchange e as demais operações alteram o arquivo diretamente.
+
+    Exemplos:
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'album.figp')
+    >>> with PopulationStore.create(path, 60, 3) as store:
+    ...     a, b = store[0], store[2]
+    ...     for code in [3, 3, 12, 54, 54]:
+    ...         a.insert(code)
+    ...     for code in [0, 0, 12]:
+    ...         b.insert(code)
+    ...     a.exchange(b)
+    ...     del a, b
+    >>> with PopulationStore(path) as store:
+    ...     len(store), store[0].str_stickers(), store[2].str_repeat()
+    (3, '[0, 3, 12, 54]', '[]')
+    >>> with PopulationStore(path, writable=False) as store:
+    ...     view = store[0]
+    ...     try:
+    ...         view.insert(5)
+    ...     except ValueError as error:
+    ...         print(error)
+    ...     view.total_units, view.str_stickers()
+    ...     del view
+    A coleção é somente leitura
+    (5, '[0, 3, 12, 54]')
+    '''
+    # Caminho do arquivo
+    path: str
+    # Se o arquivo foi aberto para escrita
+    writable: bool
+    # Máximo de figurinhas únicas do álbum
+    max_unique: int
+    # Quantidade de colecionadores
+    collectors: int
+    # Bytes de cada linha
+    row_bytes: int
+    # Arquivo aberto
+    file: Any
+    # Mapeamento do arquivo na memória
+    map: mmap.mmap
+    # Coleções em uso, por linha, para que cada linha tenha uma só coleção
+    views: WeakValueDictionary[int, Collection]
+
+    def __init__(self, path: str, writable: bool = True) -> None:
+        '''
+        Abre o armazenamento do arquivo *path*. Só o cabeçalho é lido; as
+        linhas são carregadas sob demanda. Se *writable* for False, o arquivo
+        é aberto apenas para leitura.
+        '''
+        self.path = path
+        self.writable = writable
+        self.file = open(path, 'r+b' if writable else 'rb')
+        try:
+            magic, version, self.max_unique, self.collectors = HEADER.unpack(
+                self.file.read(HEADER.size))
+        except struct.error:
+            self.file.close()
+            raise ValueError('O arquivo não é um armazenamento de coleções')
+        if magic != MAGIC or version != VERSION:
+            self.file.close()
+            raise ValueError('O arquivo não é um armazenamento de coleções')
+        self.row_bytes = (self.max_unique + 1) * COUNT_BYTES
+        access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+        self.map = mmap.mmap(self.file.fileno(), 0, access=access)
+        self.views = WeakValueDictionary()
+
+    @classmethod
+    def create(cls, path: str, max_unique: int, collectors: int) -> PopulationStore:
+        '''
+        Cria no arquivo *path* um armazenamento com *collectors* coleções
+        vazias de um álbum com códigos de 0 a *max_unique* e o abre.
+
+        O arquivo é estendido sem escrever as linhas, que começam zeradas.
+        '''
+        with open(path, 'wb') as fp:
+            fp.write(HEADER.pack(MAGIC, VERSION, max_unique, collectors))
+            fp.truncate(HEADER.size + collectors * (max_unique + 1) * COUNT_BYTES)
+        return cls(path)
+
+    def __len__(self) -> int:
+        return self.collectors
+
+    def __getitem__(self, collector: int) -> Collection:
+        '''
+        Coleção do colecionador *collector*. Enquanto ela estiver em uso,
+        novas consultas à mesma linha devolvem a mesma coleção.
+        '''
+        if not 0 <= collector < self.collectors:
+            raise IndexError('Colecionador fora do armazenamento')
+        view = self.views.get(collector)
+        if view is None:
+            start = HEADER.size + collector * self.row_bytes
+            row = memoryview(self.map)[start:start + self.row_bytes].cast('I')
+            view = Collection(self.max_unique, counts=row)
+            self.views[collector] = view
+        return view
+
+    def resize(self, collectors: int) -> None:
+        '''
+        Altera a quantidade de colecionadores para *collectors*. As novas
+        coleções começam vazias. Nenhuma coleção obtida do armazenamento
+        pode estar em uso, porque o arquivo é mapeado de novo.
+        '''
+        if not self.writable:
+            raise ValueError('O armazenamento foi aberto apenas para leitura')
+        if len(self.views) > 0:
+            raise ValueError('Há coleções do armazenamento em uso')
+        self.map.close()
+        self.file.truncate(HEADER.size + collectors * self.row_bytes)
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, self.max_unique, collectors))
+        self.file.flush()
+        self.collectors = collectors
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE)
+
+    def flush(self) -> None:
+        '''
+        Grava no arquivo as alterações feitas nas coleções.
+        '''
+        self.map.flush()
+
+    def close(self) -> None:
+        '''
+        Grava as alterações e fecha o arquivo. As coleções obtidas do
+        armazenamento devem ser descartadas antes.
+        '''
+        self.views.clear()
+        if not self.map.closed:
+            if self.writable:
+                self.map.flush()
+            self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> PopulationStore:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,190 @@
+'''
+Registro das coleções de vários colecionadores de um mesmo álbum, com um
+índice invertido por código para encontrar parceiros de troca.
+
+Para cada código do álbum, o registro guarda quem tem a figurinha repetida
+e quem não a possui. Os dois conjuntos são atualizados a cada insert,
+remove e exchange feitos pelo registro, então as alterações das coleções
+devem passar por ele.
+'''
+from __future__ import annotations
+from bitset import eligible, exchange_codes
+from collection_array import Collection as ArrayCollection
+from typing import Any
+import heapq
+
+
+class Registry:
+    '''
+    Coleções de um álbum com códigos de 0 a *max_unique*, identificadas por
+    chaves inteiras, com um índice de quem tem cada figurinha repetida e de
+    quem não a possui.
+
+    *backend* é a classe das coleções criadas pelo registro; ela deve
+    oferecer a interface de tad_collection.Collection.
+
+    Exemplos:
+    >>> r = Registry(60)
+    >>> for code in [3, 3, 12, 54, 54, 60, 60]:
+    ...     r.insert(1, code)
+    >>> for code in [0, 0, 12, 51, 51]:
+    ...     r.insert(2, code)
+    >>> for code in [3, 0, 0, 7, 7]:
+    ...     r.insert(3, code)
+    >>> sorted(r.holders[0]), len(r.missing[0])
+    ([2, 3], 1)
+    >>> r.best_partners(1, 2)
+    [(2, 2), (3, 2)]
+    >>> r.exchange(1, 2)
+    >>> r.collection(1).str_stickers(), r.collection(2).str_repeat()
+    ('[0, 3, 12, 51, 54, 60]', '[]')
+    >>> sorted(r.holders[0]), sorted(r.missing[0])
+    ([3], [])
+    >>> r.best_partners(1, 2)
+    [(3, 1)]
+    >>> r.best_partners(9, 2) # consultas não registram colecionadores
+    Traceback (most recent call last):
+    ...
+    KeyError: 9
+    >>> len(r)
+    3
+    '''
+    # Máximo de figurinhas únicas do álbum
+    max_unique: int
+    # Classe das coleções criadas pelo registro
+    backend: Any
+    # Coleções, por chave do colecionador
+    collections: dict[int, Any]
+    # holders[code] tem os colecionadores com a figurinha *code* repetida
+    holders: list[set[int]]
+    # missing[code] tem os colecionadores que não possuem a figurinha *code*
+    missing: list[set[int]]
+
+    def __init__(self, max_unique: int, backend: Any = ArrayCollection) -> None:
+        self.max_unique = max_unique
+        self.backend = backend
+        self.collections = {}
+        self.holders = [set() for _ in range(max_unique + 1)]
+        self.missing = [set() for _ in range(max_unique + 1)]
+
+    def __len__(self) -> int:
+        '''
+        Retorna a quantidade de colecionadores registrados.
+        '''
+        return len(self.collections)
+
+    def collection(self, collector: int) -> Any:
+        '''
+        Coleção do colecionador *collector*. Um colecionador novo começa
+        com uma coleção vazia.
+        '''
+        collection = self.collections.get(collector)
+        if collection is None:
+            collection = self.backend(self.max_unique)
+            self.add(collector, collection)
+        return collection
+
+    def add(self, collector: int, collection: Any) -> None:
+        '''
+        Registra a coleção *collection*, já preenchida, para o colecionador
+        *collector*, que não pode estar registrado.
+        '''
+        if collector in self.collections:
+            raise ValueError('Colecionador já registrado')
+        if collection.owned.size != self.max_unique + 1:
+            raise ValueError('Quantidade de cartas únicas diferentes')
+        self.collections[collector] = collection
+        for code in collection.iter_missing():
+            self.missing[code].add(collector)
+        for code, _ in collection.iter_repeats():
+            self.holders[code].add(collector)
+
+    def insert(self, collector: int, code: int) -> None:
+        '''
+        Aumenta em 1 a quantidade da figurinha *code* na coleção de
+        *collector* e atualiza o índice.
+        '''
+        collection = self.collection(collector)
+        collection.insert(code)
+        if 0 <= code <= self.max_unique:
+            self.__sync(collector, collection, code)
+
+    def remove(self, collector: int, code: int) -> None:
+        '''
+        Reduz em 1 a quantidade da figurinha *code* na coleção de
+        *collector*, que deve estar registrado, e atualiza o índice.
+        '''
+        collection = self.collections[collector]
+        collection.remove(code)
+        if 0 <= code <= self.max_unique:
+            self.__sync(collector, collection, code)
+
+    def exchange(self, collector: int, other: int) -> None:
+        '''
+        Realiza as trocas entre as coleções de *collector* e *other*, que
+        devem estar registrados. Os códigos trocados são calculados antes, e
+        só eles são atualizados no índice.
+        '''
+        a, b = self.collections[collector], self.collections[other]
+        sent, received = exchange_codes(a.owned, a.duplicated, b.owned, b.duplicated,
+                                        a.duplicate_index, b.duplicate_index)
+        a.exchange(b)
+        for code in sent + received:
+            self.__sync(collector, a, code)
+            self.__sync(other, b, code)
+
+    def best_partners(self, collector: int, k: int) -> list[tuple[int, int]]:
+        '''
+        Os até *k* colecionadores com quem *collector* faria mais trocas em
+        exchange(), como pares (colecionador, trocas), em ordem decrescente
+        de trocas e crescente de chave. Colecionadores sem trocas possíveis
+        não aparecem. *collector* deve estar registrado; a consulta não
+        registra colecionadores.
+
+        Os candidatos saem do índice: quem tem repetida alguma figurinha
+        que falta a *collector*, ou quem não tem alguma que ele tem
+        repetida, o que for mais barato de percorrer. Só as coleções dos
+        candidatos são consultadas para contar o outro lado da troca.
+        '''
+        mine = self.collections[collector]
+        wanted = list(mine.iter_missing())
+        spare = list(mine.duplicate_index)
+        take_cost = sum(len(self.holders[code]) for code in wanted)
+        give_cost = sum(len(self.missing[code]) for code in spare)
+        by_take = take_cost <= give_cost
+        codes, index = (wanted, self.holders) if by_take else (spare, self.missing)
+
+        # counts[p]: figurinhas do lado da troca contado pelo índice
+        counts: dict[int, int] = {}
+        for code in codes:
+            for partner in index[code]:
+                counts[partner] = counts.get(partner, 0) + 1
+        counts.pop(collector, None)
+
+        scores: list[tuple[int, int]] = []
+        for partner, count in counts.items():
+            theirs = self.collections[partner]
+            if by_take:
+                other, _ = eligible(mine.duplicated, theirs.owned, mine.duplicate_index)
+            else:
+                other, _ = eligible(theirs.duplicated, mine.owned, theirs.duplicate_index)
+            trades = min(count, other)
+            if trades > 0:
+                scores.append((partner, trades))
+        return heapq.nsmallest(k, scores, key=lambda score: (-score[1], score[0]))
+
+    # MÉTODOS AUXILIARES
+
+    def __sync(self, collector: int, collection: Any, code: int) -> None:
+        '''
+        Atualiza os conjuntos do código *code* para a situação atual da
+        coleção de *collector*.
+        '''
+        if code in collection.owned:
+            self.missing[code].discard(collector)
+        else:
+            self.missing[code].add(collector)
+        if code in collection.duplicated:
+            self.holders[code].add(collector)
+        else:
+            self.holders[code].discard(collector)
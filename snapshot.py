@@ -0,0 +1,259 @@
+'''
+Formato binário das coleções, usado por to_bytes()/from_bytes() e
+save()/load().
+
+Layout (inteiros sem sinal em varint, 7 bits por byte):
+
+    MAGIC  versão  codificação  max_unique  distintas  códigos  quantidades
+
+Os códigos das figurinhas distintas são guardados de uma de duas formas,
+escolhida pela que ocupar menos bytes:
+
+- DELTA: a diferença de cada código para o anterior, menos 1, em varint;
+- BITSET: um bit por código do álbum, em palavras de 64 bits little-endian,
+  no mesmo formato de Bitset.words.
+
+Em seguida vem, para cada figurinha distinta em ordem crescente de código,
+a quantidade além da primeira, em varint.
+
+As diferenças entre duas coleções, usadas por diff()/apply_delta(), têm um
+formato próprio, com uma entrada por código cuja quantidade mudou:
+
+    DELTA_MAGIC  versão  max_unique  alterações  (código  variação)...
+
+Os códigos vêm em ordem crescente, como a diferença para o anterior menos
+1, e a variação da quantidade em varint zigzag (0, -1, 1, -2, 2, ...).
+'''
+from __future__ import annotations
+from array import array
+from bitset import WORD_BITS, lowest_bits
+from typing import Iterable
+import sys
+
+# Identificação do formato
+MAGIC = b'FIGS'
+# Versão atual do formato
+VERSION = 1
+# Códigos guardados como diferenças em varint
+DELTA = 0
+# Códigos guardados como um bit por código do álbum
+BITSET = 1
+# Identificação das diferenças entre coleções
+DELTA_MAGIC = b'FIGD'
+
+
+def encode_snapshot(max_unique: int, pairs: Iterable[tuple[int, int]]) -> bytes:
+    '''
+    Codifica uma coleção de um álbum com códigos de 0 a *max_unique* a partir
+    dos pares (código, quantidade além da primeira) de *pairs*, que devem
+    estar em ordem crescente de código.
+
+    Exemplos:
+    >>> data = encode_snapshot(1000, [(3, 0), (10, 2), (900, 1)])
+    >>> data[len(MAGIC) + 1] == DELTA, len(data)
+    (True, 16)
+    >>> decode_snapshot(data)
+    (1000, [3, 10, 900], [1, 3, 2])
+    >>> data = encode_snapshot(100, [(code, 0) for code in range(0, 100, 2)])
+    >>> data[len(MAGIC) + 1] == BITSET, len(data)
+    (True, 74)
+    >>> decode_snapshot(memoryview(data))[1][:5]
+    [0, 2, 4, 6, 8]
+    '''
+    codes: list[int] = []
+    extras = bytearray()
+    for code, extra in pairs:
+        codes.append(code)
+        write_varint(extras, extra)
+
+    deltas = bytearray()
+    previous = -1
+    for code in codes:
+        write_varint(deltas, code - previous - 1)
+        previous = code
+    words = (max_unique + WORD_BITS) // WORD_BITS
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    if len(deltas) <= words * (WORD_BITS // 8):
+        out.append(DELTA)
+        write_varint(out, max_unique)
+        write_varint(out, len(codes))
+        out += deltas
+    else:
+        out.append(BITSET)
+        write_varint(out, max_unique)
+        write_varint(out, len(codes))
+        bits = array('Q', [0]) * words
+        for code in codes:
+            bits[code // WORD_BITS] |= 1 << (code % WORD_BITS)
+        if sys.byteorder != 'little':
+            bits.byteswap()
+        out += bits.tobytes()
+    out += extras
+    return bytes(out)
+
+
+def decode_snapshot(data: bytes | memoryview) -> tuple[int, list[int], list[int]]:
+    '''
+    Decodifica os bytes gerados por encode_snapshot(). Devolve a tupla
+    (max_unique, códigos, quantidades), com os códigos em ordem crescente
+    e a quantidade total de cada um.
+
+    *data* é lido através de um memoryview, sem cópias; no formato BITSET,
+    as palavras são lidas direto dos bytes.
+    '''
+    view = memoryview(data)
+    if bytes(view[:len(MAGIC)]) != MAGIC:
+        raise ValueError('Os dados não são uma coleção salva')
+    pos = len(MAGIC)
+    if len(view) < pos + 2 or view[pos] != VERSION:
+        raise ValueError('Versão do formato não suportada')
+    encoding = view[pos + 1]
+    max_unique, pos = read_varint(view, pos + 2)
+    distinct, pos = read_varint(view, pos)
+
+    codes: list[int] = []
+    if encoding == DELTA:
+        previous = -1
+        for _ in range(distinct):
+            delta, pos = read_varint(view, pos)
+            previous += delta + 1
+            codes.append(previous)
+    elif encoding == BITSET:
+        size = (max_unique + WORD_BITS) // WORD_BITS * (WORD_BITS // 8)
+        if len(view) < pos + size:
+            raise ValueError('Dados da coleção incompletos')
+        words: memoryview | array[int]
+        if sys.byteorder == 'little':
+            words = view[pos:pos + size].cast('Q')
+        else:
+            swapped = array('Q', view[pos:pos + size].cast('Q'))
+            swapped.byteswap()
+            words = swapped
+        codes = lowest_bits(words, distinct)
+        pos += size
+    else:
+        raise ValueError('Codificação da coleção desconhecida')
+
+    if len(codes) != distinct or (codes and codes[-1] > max_unique):
+        raise ValueError('Dados da coleção inválidos')
+    quants: list[int] = []
+    for _ in range(distinct):
+        extra, pos = read_varint(view, pos)
+        quants.append(extra + 1)
+    return max_unique, codes, quants
+
+
+def diff_pairs(old: Iterable[tuple[int, int]],
+               new: Iterable[tuple[int, int]]) -> list[tuple[int, int]]:
+    '''
+    Compara duas coleções dadas pelos pares (código, quantidade além da
+    primeira) de *old* e *new*, ambos em ordem crescente de código, em uma
+    única intercalação. Devolve os pares (código, variação) que levam as
+    quantidades de *old* às de *new*, em ordem crescente de código.
+
+    Exemplos:
+    >>> diff_pairs([(1, 0), (4, 2), (9, 0)], [(1, 0), (4, 0), (7, 1)])
+    [(4, -2), (7, 2), (9, -1)]
+    '''
+    changes: list[tuple[int, int]] = []
+    old_it, new_it = iter(old), iter(new)
+    a = next(old_it, None)
+    b = next(new_it, None)
+    while a is not None or b is not None:
+        if b is None or (a is not None and a[0] < b[0]):
+            changes.append((a[0], -(a[1] + 1))) #type: ignore
+            a = next(old_it, None)
+        elif a is None or b[0] < a[0]:
+            changes.append((b[0], b[1] + 1))
+            b = next(new_it, None)
+        else:
+            if a[1] != b[1]:
+                changes.append((a[0], b[1] - a[1]))
+            a = next(old_it, None)
+            b = next(new_it, None)
+    return changes
+
+
+def encode_delta(max_unique: int, changes: Iterable[tuple[int, int]]) -> bytes:
+    '''
+    Codifica os pares (código, variação) de *changes*, em ordem crescente de
+    código, para um álbum com códigos de 0 a *max_unique*.
+
+    Exemplos:
+    >>> data = encode_delta(1000, [(4, -2), (7, 2), (900, -1)])
+    >>> len(data)
+    15
+    >>> decode_delta(data)
+    (1000, [(4, -2), (7, 2), (900, -1)])
+    '''
+    body = bytearray()
+    count = 0
+    previous = -1
+    for code, change in changes:
+        write_varint(body, code - previous - 1)
+        write_varint(body, change * 2 if change >= 0 else -change * 2 - 1)
+        previous = code
+        count += 1
+    out = bytearray(DELTA_MAGIC)
+    out.append(VERSION)
+    write_varint(out, max_unique)
+    write_varint(out, count)
+    out += body
+    return bytes(out)
+
+
+def decode_delta(data: bytes | memoryview) -> tuple[int, list[tuple[int, int]]]:
+    '''
+    Decodifica os bytes gerados por encode_delta(). Devolve a tupla
+    (max_unique, pares (código, variação)).
+    '''
+    view = memoryview(data)
+    if bytes(view[:len(DELTA_MAGIC)]) != DELTA_MAGIC:
+        raise ValueError('Os dados não são uma diferença entre coleções')
+    pos = len(DELTA_MAGIC)
+    if len(view) < pos + 1 or view[pos] != VERSION:
+        raise ValueError('Versão do formato não suportada')
+    max_unique, pos = read_varint(view, pos + 1)
+    count, pos = read_varint(view, pos)
+    changes: list[tuple[int, int]] = []
+    code = -1
+    for _ in range(count):
+        gap, pos = read_varint(view, pos)
+        zigzag, pos = read_varint(view, pos)
+        code += gap + 1
+        changes.append((code, (zigzag >> 1) ^ -(zigzag & 1)))
+    if code > max_unique:
+        raise ValueError('Dados da diferença inválidos')
+    return max_unique, changes
+
+
+def write_varint(out: bytearray, value: int) -> None:
+    '''
+    Acrescenta a *out* o inteiro não negativo *value* em varint: 7 bits por
+    byte, do menos para o mais significativo, com o bit mais alto ligado
+    em todos os bytes menos o último.
+    '''
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(view: memoryview, pos: int) -> tuple[int, int]:
+    '''
+    Lê um varint de *view* a partir da posição *pos*. Devolve o valor e a
+    posição seguinte ao varint.
+    '''
+    value = 0
+    shift = 0
+    while True:
+        if pos >= len(view):
+            raise ValueError('Dados da coleção incompletos')
+        byte = view[pos]
+        value |= (byte & 0x7F) << shift
+        pos += 1
+        if byte < 0x80:
+            return value, pos
+        shift += 7
@@ -1,4 +1,17 @@
 from __future__ import annotations
+from bisect import bisect_left, insort
+from bitset import Bitset
+from fenwick import CodeRanks
+from itertools import groupby
+from snapshot import decode_snapshot, diff_pairs, encode_delta, encode_snapshot
+from typing import IO, Any, Callable, Iterable, Iterator, TypeVar
+
+# Quantidade de figurinhas escritas de cada vez por write_stickers/write_repeat
+WRITE_CHUNK = 4096
+
+# Uma implementação de Collection, para os métodos que recebem ou devolvem
+# coleções da mesma implementação
+C = TypeVar('C', bound='Collection')
 
 class Collection:
     '''
@@ -6,6 +19,11 @@ class Collection:
     Indica quais e quantas figurinhas o colecionador possui, além
     do máximo de figurinhas distintas que o álbum tem.
 
+    As implementações herdam desta classe as listagens, as consultas e a
+    serialização, escritas só sobre os campos abaixo, iter_stickers() e
+    iter_repeats(). Cada uma define o armazenamento e as operações que o
+    alteram, chamando __track() a cada mudança de quantidade.
+
     Exemplos:
     >>> a = Collection(60)
     >>> a.str_stickers()
@@ -115,7 +133,28 @@ class Collection:
     >>> b.str_repeat()
     '[12 (1), 51 (1)]'
     '''
-    # campos: varia com a implementação
+    # campos: variam com a implementação, mas todas mantêm os abaixo, dos
+    # quais dependem as consultas, as listagens e a serialização daqui
+
+    # Máximo de figurinhas únicas
+    max_unique: int
+    # Total de figurinhas únicas
+    tot_stickers: int
+    # Total de unidades de figurinhas, contando as repetidas
+    tot_units: int
+    # Figurinhas que a coleção possui
+    owned: Bitset
+    # Figurinhas que a coleção possui repetidas
+    duplicated: Bitset
+    # Códigos das figurinhas repetidas, em ordem crescente
+    duplicate_index: list[int]
+    # Contagens por intervalo de códigos, criadas na primeira consulta
+    ranks: CodeRanks | None
+    # Número da versão da coleção, que muda a cada alteração
+    version: int
+    # Textos de str_stickers() e str_repeat() guardados entre as alterações
+    cache: RenderCache
+
     def __init__(self, unique: int) -> None:
         '''
         Cria uma coleção em relação a um álbum com *unique* figurinhas únicas,
@@ -141,22 +180,237 @@ class Collection:
         da coleção. Se a figurinha não estiver na coleção, nada acontece.
         '''
         raise NotImplementedError
+
+    def insert_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar insert() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os junta à coleção em uma só passada.
+        '''
+        raise NotImplementedError
+
+    def insert_counts(self, pairs: Iterable[tuple[int, int]]) -> None:
+        '''
+        Equivale a chamar insert() *count* vezes para cada par (code, count)
+        de *pairs*, sem expandir as quantidades, em uma só passada.
+        '''
+        raise NotImplementedError
+
+    def remove_many(self, codes: Iterable[int]) -> None:
+        '''
+        Equivale a chamar remove() para cada código de *codes*, mas ordena e
+        conta os códigos uma única vez e os retira da coleção em uma só passada.
+        '''
+        raise NotImplementedError
     
-    def str_stickers(self) -> str:
+    def str_stickers(self, offset: int = 0, limit: int | None = None) -> str:
         '''
         Gera uma representação em formato de sting das figurinhas da coleção.
+
+        Com *offset* e *limit*, gera apenas a página com até *limit*
+        figurinhas a partir da de posição *offset* (contando de 0).
         '''
-        raise NotImplementedError
+        if offset == 0 and limit is None:
+            return self.cache.get('stickers', self.version,
+                                  lambda: render(sticker_texts(self.iter_stickers())))
+        return render(sticker_texts(self.iter_stickers(offset, limit)))
     
-    def str_repeat(self) -> str:
+    def str_repeat(self, offset: int = 0, limit: int | None = None) -> str:
         '''
         Gera uma representação em formato de string das figurinhas repetidas
         da coleção, junto com a quantidade (além da primeira) de cada figurinha
         repetida.
+
+        Com *offset* e *limit*, gera apenas a página com até *limit*
+        figurinhas repetidas a partir da de posição *offset* (contando de 0).
+        '''
+        if offset == 0 and limit is None:
+            return self.cache.get('repeat', self.version,
+                                  lambda: render(repeat_texts(self.iter_repeats())))
+        return render(repeat_texts(self.iter_repeats(offset, limit)))
+
+    def iter_stickers(self, offset: int = 0,
+                      limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Percorre as figurinhas da coleção em ordem crescente de código,
+        gerando os pares (código, quantidade além da primeira).
+
+        Com *offset* e *limit*, gera apenas até *limit* figurinhas a partir
+        da de posição *offset* (contando de 0).
         '''
         raise NotImplementedError
+
+    def iter_repeats(self, offset: int = 0,
+                     limit: int | None = None) -> Iterator[tuple[int, int]]:
+        '''
+        Como iter_stickers(), mas gera apenas as figurinhas repetidas.
+        '''
+        raise NotImplementedError
+
+    def write_stickers(self, fp: IO[str]) -> None:
+        '''
+        Escreve em *fp* o mesmo texto de str_stickers(), em partes, sem montar
+        a string inteira na memória.
+        '''
+        write_chunks(fp, sticker_texts(self.iter_stickers()))
+
+    def write_repeat(self, fp: IO[str]) -> None:
+        '''
+        Escreve em *fp* o mesmo texto de str_repeat(), em partes, sem montar
+        a string inteira na memória.
+        '''
+        write_chunks(fp, repeat_texts(self.iter_repeats()))
+
+    def __len__(self) -> int:
+        '''
+        Quantidade de figurinhas distintas da coleção.
+        '''
+        return self.tot_stickers
+
+    @property
+    def distinct(self) -> int:
+        '''
+        Quantidade de figurinhas distintas da coleção.
+        '''
+        return self.tot_stickers
+
+    @property
+    def total_units(self) -> int:
+        '''
+        Quantidade total de figurinhas da coleção, contando as repetidas.
+        '''
+        return self.tot_units
+
+    @property
+    def duplicate_codes(self) -> int:
+        '''
+        Quantidade de figurinhas distintas que a coleção tem repetidas.
+        '''
+        return len(self.duplicate_index)
+
+    @property
+    def spare_units(self) -> int:
+        '''
+        Quantidade de figurinhas sobrando, ou seja, as unidades além da
+        primeira de cada figurinha.
+        '''
+        return self.tot_units - self.tot_stickers
+
+    @property
+    def missing(self) -> int:
+        '''
+        Quantidade de figurinhas do álbum que faltam na coleção.
+        '''
+        return self.max_unique + 1 - self.tot_stickers
     
-    def exchange(self, other: Collection):
+    def count_owned(self, lo: int, hi: int) -> int:
+        '''
+        Quantidade de figurinhas distintas da coleção com códigos de *lo*
+        a *hi*.
+        '''
+        return self.__code_ranks().count_owned(lo, hi)
+
+    def count_units(self, lo: int, hi: int) -> int:
+        '''
+        Quantidade de figurinhas da coleção, contando as repetidas, com
+        códigos de *lo* a *hi*.
+        '''
+        return self.__code_ranks().count_units(lo, hi)
+
+    def rank(self, code: int) -> int:
+        '''
+        Quantidade de figurinhas distintas da coleção com código menor
+        que *code*.
+        '''
+        return self.__code_ranks().rank(code)
+
+    def select(self, k: int, missing: bool = False) -> int | None:
+        '''
+        Código da figurinha de posição *k* (contando de 0) entre as que a
+        coleção possui ou, se *missing* for True, entre as que faltam nela.
+        Retorna None se não houver figurinha nessa posição.
+        '''
+        return self.__code_ranks().select(k, missing)
+
+    def iter_missing(self) -> Iterator[int]:
+        '''
+        Percorre, em ordem crescente, os códigos das figurinhas do álbum que
+        faltam na coleção.
+        '''
+        return self.owned.iter_clear(0, self.owned.size)
+
+    def next_missing(self, code: int) -> int | None:
+        '''
+        Menor código maior que *code* de uma figurinha que falta na coleção.
+        Retorna None se não houver.
+        '''
+        return self.owned.next_clear(code + 1)
+
+    def prev_owned(self, code: int) -> int | None:
+        '''
+        Maior código menor que *code* de uma figurinha da coleção. Retorna
+        None se não houver.
+        '''
+        return self.owned.prev_set(code - 1)
+
+    def missing_in_range(self, lo: int, hi: int) -> list[int]:
+        '''
+        Códigos de *lo* a *hi*, em ordem crescente, das figurinhas que faltam
+        na coleção.
+        '''
+        return list(self.owned.iter_clear(lo, hi + 1))
+
+    def to_bytes(self) -> bytes:
+        '''
+        Codifica a coleção no formato binário de snapshot.py.
+        '''
+        return encode_snapshot(self.max_unique, self.iter_stickers())
+
+    @classmethod
+    def from_bytes(cls: type[C], data: bytes | memoryview, **options: Any) -> C:
+        '''
+        Cria uma coleção a partir dos bytes gerados por to_bytes(). As
+        *options* são repassadas ao construtor; o número de figurinhas
+        únicas vem dos bytes.
+
+        A coleção é montada de uma vez a partir dos códigos lidos, sem
+        passar por insert().
+        '''
+        max_unique, codes, quants = decode_snapshot(data)
+        collection = cls(max_unique, **options)
+        collection.__load(codes, quants)
+        return collection
+
+    def save(self, path: str) -> None:
+        '''
+        Grava a coleção no arquivo *path*, no formato de to_bytes().
+        '''
+        with open(path, 'wb') as fp:
+            fp.write(self.to_bytes())
+
+    @classmethod
+    def load(cls: type[C], path: str, **options: Any) -> C:
+        '''
+        Lê a coleção gravada com save() no arquivo *path*. As *options* são
+        repassadas ao construtor.
+        '''
+        with open(path, 'rb') as fp:
+            return cls.from_bytes(memoryview(fp.read()), **options)
+
+    def diff(self, other: Collection) -> bytes:
+        '''
+        Codifica as variações de quantidade que levam a coleção ao conteúdo
+        de *other*, comparando as duas em uma única intercalação.
+        '''
+        return encode_delta(self.max_unique, diff_pairs(self.iter_stickers(), other.iter_stickers()))
+
+    def apply_delta(self, delta: bytes | memoryview) -> None:
+        '''
+        Aplica à coleção as variações de *delta*, gerado por diff(). Depois
+        de a.apply_delta(a.diff(b)), *a* tem o mesmo conteúdo de *b*.
+        '''
+        raise NotImplementedError
+
+    def exchange(self: C, other: C) -> None:
         '''
         Realiza o máximo de trocas válidas possíveis entre a coleção e *other*.
 
@@ -169,4 +423,191 @@ class Collection:
         Requer que *other* seja uma coleção com o mesmo número de cartas únicas
         '''
         raise NotImplementedError
-    
+
+    # MÉTODOS AUXILIARES
+
+    def __load(self, codes: list[int], quants: list[int]) -> None:
+        '''
+        Preenche a coleção, que deve estar vazia, com as figurinhas de
+        *codes*, em ordem crescente, e as quantidades de *quants*.
+        '''
+        raise NotImplementedError
+
+    def __code_ranks(self) -> CodeRanks:
+        '''
+        Devolve as contagens por intervalo de códigos da coleção, criando-as
+        na primeira consulta. A partir daí, elas acompanham as alterações.
+        '''
+        if self.ranks is None:
+            self.ranks = CodeRanks(self.max_unique + 1,
+                                   ((code, extra + 1) for code, extra in self.iter_stickers()))
+        return self.ranks
+
+    def __track(self, code: int, old: int, quant: int) -> None:
+        '''
+        Atualiza os bitsets, o índice de repetidas, o total de unidades e a
+        versão da coleção após a quantidade da figurinha de código *code*
+        passar de *old* para *quant*.
+
+        O total de figurinhas únicas fica com cada implementação, que o
+        altera junto com o armazenamento das figurinhas.
+        '''
+        self.version += 1
+        self.tot_units += quant - old
+        if quant > 0:
+            self.owned.add(code)
+        else:
+            self.owned.discard(code)
+        if quant > 1:
+            self.duplicated.add(code)
+        else:
+            self.duplicated.discard(code)
+        if (quant > 1) != (old > 1):
+            if quant > 1:
+                insort(self.duplicate_index, code)
+            else:
+                del self.duplicate_index[bisect_left(self.duplicate_index, code)]
+        if self.ranks is not None:
+            self.ranks.update(code, old, quant)
+
+
+def count_codes(codes: Iterable[int], max_unique: int) -> list[tuple[int, int]]:
+    '''
+    Ordena e conta os códigos de *codes* que estão no intervalo de 0 a
+    *max_unique*; os demais são descartados, como em insert().
+
+    Devolve os pares (código, quantidade) em ordem crescente de código.
+
+    Exemplo:
+    >>> count_codes([5, 1, 5, -1, 9, 1, 5], 8)
+    [(1, 2), (5, 3)]
+    '''
+    valid = sorted(code for code in codes if 0 <= code <= max_unique)
+    return [(code, sum(1 for _ in group)) for code, group in groupby(valid)]
+
+
+def merge_counts(pairs: Iterable[tuple[int, int]], max_unique: int) -> list[tuple[int, int]]:
+    '''
+    Soma as quantidades dos pares (código, quantidade) de *pairs* com o mesmo
+    código. Códigos fora do intervalo de 0 a *max_unique* e quantidades
+    menores que 1 são descartados.
+
+    Devolve os pares (código, quantidade) em ordem crescente de código.
+
+    Exemplo:
+    >>> merge_counts([(5, 2), (1, 1), (5, 1), (70, 4), (3, 0)], 60)
+    [(1, 1), (5, 3)]
+    '''
+    totals: dict[int, int] = {}
+    for code, count in pairs:
+        if 0 <= code <= max_unique and count > 0:
+            totals[code] = totals.get(code, 0) + count
+    return sorted(totals.items())
+
+
+def sticker_texts(pairs: Iterable[tuple[int, int]]) -> Iterator[str]:
+    '''
+    Texto de cada figurinha dos pares (código, repetidas) de *pairs*,
+    no formato de str_stickers().
+    '''
+    return (str(code) for code, _ in pairs)
+
+
+def repeat_texts(pairs: Iterable[tuple[int, int]]) -> Iterator[str]:
+    '''
+    Texto de cada figurinha dos pares (código, repetidas) de *pairs*,
+    no formato de str_repeat().
+    '''
+    return (f'{code} ({extra})' for code, extra in pairs)
+
+
+def render(texts: Iterable[str]) -> str:
+    '''
+    Junta *texts* no formato de lista usado por str_stickers() e str_repeat().
+
+    Exemplo:
+    >>> render(repeat_texts([(3, 2), (54, 1)]))
+    '[3 (2), 54 (1)]'
+    '''
+    return '[' + ', '.join(texts) + ']'
+
+
+def write_chunks(fp: IO[str], texts: Iterable[str]) -> None:
+    '''
+    Escreve em *fp* o mesmo texto de render(*texts*), juntando no máximo
+    WRITE_CHUNK itens por chamada de fp.write().
+
+    Exemplo:
+    >>> import io
+    >>> fp = io.StringIO()
+    >>> write_chunks(fp, sticker_texts((code, 0) for code in range(5)))
+    >>> fp.getvalue()
+    '[0, 1, 2, 3, 4]'
+    '''
+    fp.write('[')
+    separator = ''
+    chunk: list[str] = []
+    for text in texts:
+        chunk.append(text)
+        if len(chunk) == WRITE_CHUNK:
+            fp.write(separator + ', '.join(chunk))
+            separator = ', '
+            chunk = []
+    if chunk:
+        fp.write(separator + ', '.join(chunk))
+    fp.write(']')
+
+
+class RenderCache:
+    '''
+    Guarda textos gerados por uma coleção, como os de str_stickers() e
+    str_repeat(), junto com a versão da coleção em que foram gerados. Um
+    texto guardado só é reaproveitado enquanto a versão não mudar.
+
+    Textos com mais de *limit* caracteres não são guardados; com None não
+    há limite.
+
+    Exemplos:
+    >>> cache = RenderCache(limit=5)
+    >>> cache.get('stickers', 0, lambda: '[1]')
+    '[1]'
+    >>> cache.get('stickers', 0, lambda: '[2]') # mesma versão: reaproveita
+    '[1]'
+    >>> cache.get('stickers', 1, lambda: '[1, 2]') # passa do limite
+    '[1, 2]'
+    >>> cache.get('stickers', 1, lambda: '[1, 2]')
+    '[1, 2]'
+    >>> cache.hits, cache.misses
+    (1, 3)
+    '''
+    # Tamanho máximo, em caracteres, de um texto guardado (None: sem limite)
+    limit: int | None
+    # Consultas atendidas com um texto guardado
+    hits: int
+    # Consultas em que o texto precisou ser gerado
+    misses: int
+    # Para cada chave, o par (versão, texto)
+    entries: dict[str, tuple[int, str]]
+
+    def __init__(self, limit: int | None = None) -> None:
+        self.limit = limit
+        self.hits = 0
+        self.misses = 0
+        self.entries = {}
+
+    def get(self, key: str, version: int, build: Callable[[], str]) -> str:
+        '''
+        Devolve o texto guardado em *key* se ele foi gerado na versão
+        *version*; senão, gera o texto com *build* e o guarda.
+        '''
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == version:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        text = build()
+        if self.limit is None or len(text) <= self.limit:
+            self.entries[key] = (version, text)
+        else:
+            self.entries.pop(key, None)
+        return text